@@ -3,6 +3,7 @@ import logging
 import os
 import sys
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
 # 确保项目根目录在 Python 路径中
@@ -10,61 +11,107 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 os.chdir(project_root)  # 切换工作目录到 md2video
 
+# news2md 与 md2video 同级，按仓库结构定位，不依赖本机绝对路径
+NEWS2MD_DIR = project_root.resolve().parent / "news2md"
+
 from processors import (
     md2html_main,
     html2img_main,
     img2video_main,
     md2audio_main
 )
-from utils.paths import get_log_file_path
-
-# 初始化日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(get_log_file_path("main"))
-    ]
-)
+from utils.logging_setup import setup_queue_logging
+from utils.retry import backoff_delay, is_transient_error
+
 logger = logging.getLogger(__name__)
 
+# 同时占用外部服务（LLM、TTS、无头浏览器）的步骤上限
+UPSTREAM_CONCURRENCY = 2
+upstream_slots = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+
+# 每个步骤最多执行次数（含第一次），限制重试总量，避免耗时步骤反复重跑
+STEP_TRIES = 3
+STEP_BACKOFF_BASE = 1.5
+
+async def _with_retry(coro_fn, *, tries=STEP_TRIES, base=STEP_BACKOFF_BASE):
+    """执行 coro_fn，只在连接失败、超时、429/503 等暂时性错误时按抖动退避重试
+
+    缺少密钥、配置或输入文件等确定性错误直接抛出，不重跑。
+    """
+    for attempt in range(tries):
+        try:
+            return await coro_fn()
+        except Exception as e:
+            if attempt == tries - 1 or not is_transient_error(e):
+                raise
+            delay = backoff_delay(attempt, base)
+            logger.warning(f"暂时性错误，{delay:.1f}秒后重试（第{attempt + 1}/{tries - 1}次）: {e}")
+            await asyncio.sleep(delay)
+
+async def run_step(name, step_fn):
+    """执行一个处理步骤：占用一个上游并发名额，暂时性错误时重试
+
+    退避等待期间不占用名额。
+
+    Args:
+        name: 步骤名称（用于日志）
+        step_fn: 无参函数，返回要等待的协程
+    """
+    async def attempt():
+        async with upstream_slots:
+            logger.debug(f"{name}开始")
+            return await step_fn()
+    return await _with_retry(attempt)
+
+@lru_cache(maxsize=1)
+def get_latest_md_paths():
+    """自动定位最新日期的 news2md 输出（/news2md/output/YYYYMMDD/），结果在进程内缓存"""
+    output_root = NEWS2MD_DIR / "output"
+    dated_names = []
+    if output_root.is_dir():
+        # os.scandir 一次遍历即可拿到目录类型，不需要逐项再 stat
+        with os.scandir(output_root) as entries:
+            dated_names = [e.name for e in entries
+                           if e.is_dir(follow_symlinks=False) and e.name.isdigit()]
+    if dated_names:
+        latest = output_root / max(dated_names)
+        return latest / "audioText.md", latest / "newsText.md"
+    # 回退到 news2md 根目录
+    return NEWS2MD_DIR / "audioText.md", NEWS2MD_DIR / "newsText.md"
+
 async def main():
     try:
-        # 自动定位最新日期的 news2md 输出（/news2md/output/YYYYMMDD/）
-        def get_latest_md_paths():
-            output_root = Path("/Users/lqcmacmini/daily_news/news2md/output")
-            dated_dirs = [d for d in output_root.glob("*") if d.is_dir() and d.name.isdigit()]
-            if dated_dirs:
-                latest = max(dated_dirs)
-                return latest / "audioText.md", latest / "newsText.md"
-            # 回退到 news2md 根目录
-            fallback_dir = Path("/Users/lqcmacmini/daily_news/news2md")
-            return fallback_dir / "audioText.md", fallback_dir / "newsText.md"
-
         audio_md_path, news_md_path = get_latest_md_paths()
 
         logger.info(f"使用的音频文稿: {audio_md_path}")
         logger.info(f"使用的新闻文稿: {news_md_path}")
 
         # 4. Markdown转音频
-        logger.info("开始执行Markdown到音频的转换...")
-        md2audio_main(str(audio_md_path))  # 这个函数不是异步的
-        logger.info("Markdown到音频转换完成")
+        # md2audio_main 是同步函数，放到线程中执行，与 HTML/图片 生成并行
+        logger.info("开始执行Markdown到音频的转换（后台线程）...")
+        audio_task = asyncio.create_task(run_step(
+            "Markdown到音频转换",
+            lambda: asyncio.to_thread(md2audio_main, str(audio_md_path))
+        ))
 
-        # 1. Markdown转HTML
-        logger.info("开始执行Markdown到HTML的转换...")
-        await md2html_main(content_path=news_md_path)
-        logger.info("Markdown到HTML转换完成")
+        try:
+            # 1. Markdown转HTML
+            logger.info("开始执行Markdown到HTML的转换...")
+            await run_step("Markdown到HTML转换", lambda: md2html_main(content_path=news_md_path))
+            logger.info("Markdown到HTML转换完成")
 
-        # 2. HTML转图片
-        logger.info("开始执行HTML到图片的转换...")
-        await html2img_main()
-        logger.info("HTML到图片转换完成")
+            # 2. HTML转图片
+            logger.info("开始执行HTML到图片的转换...")
+            await run_step("HTML到图片转换", html2img_main)
+            logger.info("HTML到图片转换完成")
+        finally:
+            # 视频合成同时依赖音频和图片，必须等音频完成
+            await audio_task
+        logger.info("Markdown到音频转换完成")
 
         # 3. 图片转视频
         logger.info("开始执行图片到视频的转换...")
-        await img2video_main()
+        await run_step("图片到视频转换", img2video_main)
         logger.info("图片到视频转换完成")
 
         logger.info("所有处理步骤已完成！")
@@ -74,5 +121,14 @@ async def main():
         raise
 
 if __name__ == "__main__":
+    # 初始化日志（文件写入在后台线程完成，不阻塞事件循环）
+    # force=True：替换各处理器模块导入时配置的 handler，统一写入 main 日志
+    # 放在这里而不是模块顶层：字幕渲染子进程（spawn）会以 __mp_main__ 重新执行本模块，不应再启动监听线程
+    setup_queue_logging("main", force=True)
     # 运行主程序 (日志目录由 get_log_file_path 自动创建)
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        import uvloop  # 可选依赖（仅 POSIX），安装后使用更快的事件循环
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main()) 
\ No newline at end of file
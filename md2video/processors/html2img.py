@@ -1,7 +1,9 @@
 import asyncio
 import argparse
+import base64
 import sys
 import os
+import re
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -19,7 +21,7 @@ except ImportError:
     sys.exit(1)
 
 # 导入公共模块
-from utils.paths import get_output_dir, get_log_file_path, get_output_base_dir
+from utils.paths import get_output_dir, get_log_file_path, get_output_base_dir, get_latest_output_dir
 
 # 初始化日志
 logging.basicConfig(
@@ -27,37 +29,155 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler(get_log_file_path("html2img"))
+        logging.FileHandler(get_log_file_path("html2img"), delay=True)
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Chromium 启动参数：减少共享内存、GPU 进程和站点隔离带来的进程开销（只渲染本地页面）
+CHROMIUM_ARGS = [
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-features=IsolateOrigins,site-per-process'
+]
+# 关闭沙箱只在容器内以 root 运行等无法启用沙箱的环境下打开（HTML2IMG_NO_SANDBOX=1）
+if os.getenv("HTML2IMG_NO_SANDBOX", "0") == "1":
+    CHROMIUM_ARGS.append('--no-sandbox')
+
+# 页面只用 HTML+CSS 排版，截图时不需要脚本和音视频；图片（角标）和字体必须保留
+BLOCKED_RESOURCE_TYPES = {'script', 'media'}
+
+# 新闻页文件名 news_<序号>，用于按序号排序
+NEWS_FILE_RE = re.compile(r'^news_(\d+)(?:_|$)')
+
+# 并发截图数（每路一个独立的浏览器上下文）
+SCREENSHOT_CONCURRENCY = int(os.getenv("HTML2IMG_CONCURRENCY", "4"))
+
+# 进程内共享的 Playwright / Chromium 实例，首次截图时启动，之后的调用直接复用
+_pw_state = {}
+
+async def _get_browser():
+    """获取共享的 Chromium 浏览器；事件循环变化或浏览器断开时重新启动"""
+    loop = asyncio.get_running_loop()
+    if _pw_state.get("loop") is not loop:
+        # 旧实例属于其它事件循环，无法在当前循环中使用
+        await _close_foreign_state()
+    elif _pw_state["browser"].is_connected():
+        return _pw_state["browser"]
+    else:
+        await close_browser()
+    
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(args=CHROMIUM_ARGS)
+    _pw_state.update(loop=loop, playwright=playwright, browser=browser)
+    return browser
+
+async def _shutdown(state):
+    """关闭浏览器并停止 Playwright 驱动进程（需在 state["loop"] 中执行）"""
+    try:
+        await state["browser"].close()
+    except Exception as e:
+        logger.warning(f"关闭浏览器失败: {e}")
+    try:
+        await state["playwright"].stop()
+    except Exception as e:
+        logger.warning(f"停止 Playwright 失败: {e}")
+
+async def _close_foreign_state():
+    """丢弃属于其它事件循环的实例前先关闭它们，避免驱动进程残留到解释器退出"""
+    state = dict(_pw_state)
+    _pw_state.clear()
+    if not state:
+        return
+    old_loop = state["loop"]
+    try:
+        if old_loop.is_running():
+            # 旧循环仍在其它线程中运行：把关闭操作投递回去并等待完成
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(_shutdown(state), old_loop))
+        elif not old_loop.is_closed():
+            # 旧循环已停止但未关闭：当前线程已有运行中的循环，在工作线程里驱动旧循环完成关闭
+            await asyncio.to_thread(old_loop.run_until_complete, _shutdown(state))
+        else:
+            logger.warning("上一个事件循环结束前未调用 close_browser()，其浏览器和 Playwright 驱动进程无法关闭，将残留到进程退出")
+    except Exception as e:
+        logger.warning(f"关闭旧事件循环中的浏览器失败: {e}")
+
+async def close_browser():
+    """关闭共享的浏览器和 Playwright（需在启动它们的事件循环中调用）"""
+    state = dict(_pw_state)
+    _pw_state.clear()
+    if state:
+        await _shutdown(state)
+
+async def _new_context(browser, width, height):
+    """创建截图用的浏览器上下文（禁用脚本并拦截无关资源）"""
+    context = await browser.new_context(viewport={'width': width, 'height': height}, java_script_enabled=False)
+    await context.route("**/*", _block_unneeded)
+    return context
+
+async def _block_unneeded(route):
+    """拦截截图用不到的资源请求"""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+def _news_sort_key(html_file):
+    """按 news_<序号> 排序，不符合命名的排在最后"""
+    match = NEWS_FILE_RE.match(html_file.stem)
+    return int(match.group(1)) if match else float('inf')
+
+async def _shoot(page, html_file, output_image, cdp=None):
+    """在已打开的页面中加载本地HTML文件并截图
+
+    传入 CDP 会话时直接调用 Page.captureScreenshot，跳过 Playwright 截图前的视口/布局处理。
+    """
+    file_url = Path(html_file).resolve().as_uri()
+    # 本地 file:// 页面没有网络请求，等待 load（含图片）即可，无需 networkidle 的空闲计时
+    await page.goto(file_url, wait_until='load')
+    if cdp is None:
+        await page.screenshot(path=str(output_image))
+        return
+    result = await cdp.send('Page.captureScreenshot', {
+        'format': 'png',
+        'captureBeyondViewport': False,
+        'fromSurface': True
+    })
+    await asyncio.to_thread(Path(output_image).write_bytes, base64.b64decode(result['data']))
+
+async def _shoot_with_pool(page_pool, html_file, output_dir):
+    """从页面池取一个空闲页面截图，完成后归还；返回是否成功"""
+    output_image = output_dir / f"{html_file.stem}.png"
+    
+    page, cdp = await page_pool.get()
+    try:
+        logger.info(f"正在处理: {html_file.name}")
+        await _shoot(page, html_file, output_image, cdp)
+        logger.info(f"截图成功: {output_image.name}")
+        return True
+    except Exception as e:
+        logger.error(f"处理 {html_file.name} 失败: {e}")
+        return False
+    finally:
+        page_pool.put_nowait((page, cdp))
+
 async def html_to_image(html_file, output_name, width=1920, height=1080):
     """将HTML文件转换为图片 (使用 Playwright)"""
     output_dir = get_output_dir("images")
     output_image = output_dir / f"{output_name}.png"
     
     try:
-        async with async_playwright() as p:
-            # 启动浏览器
-            browser = await p.chromium.launch()
-            page = await browser.new_page(viewport={'width': width, 'height': height})
+        browser = await _get_browser()
+        context = await _new_context(browser, width, height)
+        try:
+            page = await context.new_page()
             
-            # 获取HTML文件的绝对路径
-            html_path = os.path.abspath(html_file)
-            file_url = f"file://{html_path}"
-            
-            logger.info(f"正在加载页面: {file_url}")
-            
-            # 加载页面并等待网络空闲（确保资源加载完成）
-            await page.goto(file_url, wait_until='networkidle')
-            
-            # 截图
-            await page.screenshot(path=str(output_image))
+            logger.info(f"正在加载页面: {html_file}")
+            await _shoot(page, html_file, output_image)
             logger.info(f"已保存截图到 {output_image}")
-            
-            await browser.close()
             return True
+        finally:
+            await context.close()
             
     except Exception as e:
         logger.error(f"截图过程中出错: {e}")
@@ -80,43 +200,37 @@ async def process_html_directory(html_dir, width=1920, height=1080):
     
     # 然后添加所有新闻页面并排序
     news_files = [f for f in html_path.glob("*.html") if f.name != "index.html"]
-    news_files.sort(key=lambda x: int(x.stem.split('_')[1]) if x.stem.startswith('news_') and x.stem.split('_')[1].isdigit() else float('inf'))
+    news_files.sort(key=_news_sort_key)
     html_files.extend(news_files)
     
     logger.info(f"找到 {len(html_files)} 个HTML文件待处理")
     
     success_count = 0
+    # 输出目录只解析（mkdir）一次，所有截图共用
+    output_dir = get_output_dir("images")
     
-    # 使用 Playwright 处理所有文件（复用浏览器实例更高效）
+    # 使用 Playwright 处理所有文件：共享浏览器，多个上下文并发截图，页面在文件之间复用
+    contexts = []
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            context = await browser.new_context(viewport={'width': width, 'height': height})
-            
-            for html_file in html_files:
-                output_name = html_file.stem
-                output_dir = get_output_dir("images")
-                output_image = output_dir / f"{output_name}.png"
-                
-                try:
-                    page = await context.new_page()
-                    html_abs_path = os.path.abspath(html_file)
-                    file_url = f"file://{html_abs_path}"
-                    
-                    logger.info(f"正在处理: {html_file.name}")
-                    await page.goto(file_url, wait_until='networkidle')
-                    await page.screenshot(path=str(output_image))
-                    logger.info(f"截图成功: {output_image.name}")
-                    
-                    await page.close()
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"处理 {html_file.name} 失败: {e}")
-            
-            await browser.close()
+        browser = await _get_browser()
+        
+        concurrency = max(1, min(SCREENSHOT_CONCURRENCY, len(html_files)))
+        page_pool = asyncio.Queue()
+        for _ in range(concurrency):
+            context = await _new_context(browser, width, height)
+            contexts.append(context)
+            page = await context.new_page()
+            page_pool.put_nowait((page, await context.new_cdp_session(page)))
+        logger.info(f"并发截图数: {concurrency}")
+        
+        results = await asyncio.gather(*(_shoot_with_pool(page_pool, f, output_dir) for f in html_files))
+        success_count = sum(results)
             
     except Exception as e:
         logger.error(f"批量处理过程中出错: {e}")
+    finally:
+        for context in contexts:
+            await context.close()
     
     return success_count
 
@@ -151,19 +265,14 @@ async def main():
                 sys.exit(1)
         else:
             # 自动模式
-            output_dir = get_output_base_dir()
-            
             # 查找最新的日期目录
-            date_dirs = sorted([d for d in output_dir.glob("*") 
-                              if d.is_dir() and d.name.isdigit()], reverse=True)
+            latest_dir = get_latest_output_dir()
             
-            if not date_dirs:
+            if latest_dir is None:
                 # 如果没有目录，尝试使用今天的
-                today_dir = output_dir / datetime.now().strftime("%Y%m%d")
-                today_dir.mkdir(exist_ok=True)
-                date_dirs = [today_dir]
+                latest_dir = get_output_base_dir() / datetime.now().strftime("%Y%m%d")
+                latest_dir.mkdir(exist_ok=True)
             
-            latest_dir = date_dirs[0]
             html_dir = latest_dir / "html"
             
             # 确保images目录存在
@@ -182,6 +291,8 @@ async def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        await close_browser()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,10 +1,16 @@
 """Convert images to video with timeline support using MoviePy."""
+import asyncio
 import json
+import os
+import subprocess
 import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 import pysrt
+from PIL import Image, ImageFont
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
@@ -17,16 +23,22 @@ except ImportError:
     print("Error: Please install moviepy (pip install moviepy)")
     sys.exit(1)
 
+try:
+    from moviepy.config import FFMPEG_BINARY
+except ImportError:
+    FFMPEG_BINARY = "ffmpeg"
+
 # 导入路径工具
-from utils.paths import get_log_file_path, get_output_base_dir
+from utils.paths import get_log_file_path, get_latest_output_dir
+from utils.ffmpeg_escape import concat_file_entry, escape_filter_value
 
-# 初始化日志
+# 初始化日志（delay=True：首次写日志时才创建文件，字幕子进程导入本模块时不会留下空日志文件）
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler(get_log_file_path("img2video"))
+        logging.FileHandler(get_log_file_path("img2video"), delay=True)
     ]
 )
 logger = logging.getLogger(__name__)
@@ -37,41 +49,84 @@ def time_str_to_seconds(time_str):
     hours, minutes, seconds = time_str.split(':')
     return float(hours) * 3600 + float(minutes) * 60 + float(seconds)
 
+# H.264 硬件编码器候选（按优先级）及对应的 ffmpeg 输出参数
+HW_VIDEO_ENCODERS = (
+    ("h264_nvenc", ["-preset", "p4", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0", "-pix_fmt", "yuv420p"]),
+    ("h264_videotoolbox", ["-b:v", "8M", "-pix_fmt", "yuv420p"]),
+    ("h264_qsv", ["-global_quality", "23", "-pix_fmt", "nv12"]),
+)
+
+@lru_cache(maxsize=1)
+def pick_video_codec():
+    """选择视频编码器（每个进程只探测一次）
+
+    依次用一段极短的测试编码探测硬件编码器是否真正可用（编译进 ffmpeg 不代表有对应硬件），
+    都不可用时回退到 libx264。
+
+    Returns:
+        (codec, ffmpeg_params)
+    """
+    for codec, params in HW_VIDEO_ENCODERS:
+        probe_cmd = [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1",
+            "-c:v", codec, "-f", "null", "-"
+        ]
+        try:
+            result = subprocess.run(probe_cmd, capture_output=True, timeout=15)
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0:
+            logger.info(f"使用硬件视频编码器: {codec}")
+            return codec, params
+    logger.info("未检测到可用的硬件视频编码器，使用 libx264")
+    return "libx264", []
+
+# 并行光栅化字幕的进程数
+SUBTITLE_WORKERS = int(os.getenv("IMG2VIDEO_SUBTITLE_WORKERS", str(min(8, os.cpu_count() or 1))))
+# 字幕少于该条数时在本进程串行渲染：单条约 25ms，而 spawn 子进程重新导入 MoviePy 等依赖约需 1-2 秒
+SUBTITLE_POOL_MIN = 80
+
+# 字幕样式（MoviePy 和 ffmpeg 两条路径共用；像素值，ffmpeg 路径按视频高度换算成 libass 的 288 行坐标）
+SUBTITLE_FONT_SIZE = 56  # 稍微减小字号，确保更多字符能单行显示
+SUBTITLE_STROKE_WIDTH = 2
+SUBTITLE_BOTTOM_MARGIN = 80  # 字幕底边到画面底边的距离
+ASS_PLAY_RES_Y = 288
+
+# 支持中文的系统字体候选 (MacOS)
+CHINESE_FONT_CANDIDATES = (
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+
+@lru_cache(maxsize=1)
+def find_chinese_font():
+    """查找可用的中文字体路径（每个进程只探测一次），找不到返回 None"""
+    for p in CHINESE_FONT_CANDIDATES:
+        if Path(p).exists():
+            logger.info(f"使用中文字体: {p}")
+            return p
+    return None
+
 def create_subtitle_clips(subtitle_file, video_width, video_height):
     """创建字幕片段"""
     if not subtitle_file or not Path(subtitle_file).exists():
         return None
 
     # 使用 pysrt 解析字幕文件
-    try:
-        import pysrt
-        subs = pysrt.open(str(subtitle_file))
-    except ImportError:
-        logger.warning("pysrt not installed, trying naive parsing. For better results: pip install pysrt")
-        return None
+    subs = pysrt.open(str(subtitle_file))
 
     subtitle_clips = []
     
-    # 查找支持中文的系统字体 (MacOS)
-    font_path = None
-    possible_fonts = [
-        "/System/Library/Fonts/PingFang.ttc",
-        "/System/Library/Fonts/STHeiti Light.ttc",
-        "/System/Library/Fonts/STHeiti Medium.ttc",
-        "/Library/Fonts/Arial Unicode.ttf"
-    ]
-    
-    for p in possible_fonts:
-        if Path(p).exists():
-            font_path = p
-            logger.info(f"使用中文字体: {font_path}")
-            break
+    font_path = find_chinese_font()
             
     # 字幕样式配置
-    font_size = 56  # 稍微减小字号，确保更多字符能单行显示
+    font_size = SUBTITLE_FONT_SIZE
     color = 'white'
     stroke_color = 'black'
-    stroke_width = 2
+    stroke_width = SUBTITLE_STROKE_WIDTH
     
     # 如果找到中文字体则使用，否则回退
     if font_path:
@@ -80,53 +135,181 @@ def create_subtitle_clips(subtitle_file, video_width, video_height):
         logger.warning("未找到常用的中文字体文件，字幕可能乱码")
         font = 'Arial'
 
-    # 字幕位置 (底部)
-    text_position = ('center', video_height - 150)
-
+    timed_subs = []
     for sub in subs:
         start_time = sub.start.ordinal / 1000.0
         end_time = sub.end.ordinal / 1000.0
         duration = end_time - start_time
-        text = sub.text
+        if duration > 0:
+            timed_subs.append((sub.text, start_time, duration))
 
-        if duration <= 0:
-            continue
+    if not timed_subs:
+        return subtitle_clips
 
-        try:
-            # MoviePy v2.x TextClip - 单行模式
-            # 不使用 method 参数，默认就是单行渲染
-            # 配合字幕拆分（每句最多22字），确保不会换行
-            txt_clip = TextClip(
-                text=text, 
-                font_size=font_size, 
-                font=font, 
-                color=color, 
-                stroke_color=stroke_color, 
-                stroke_width=stroke_width
-            )
-            
-            txt_clip = txt_clip.with_start(start_time).with_duration(duration).with_position(text_position)
-            subtitle_clips.append(txt_clip)
-            
-        except Exception as e:
-            # 降级尝试：不使用 font 参数，使用默认字体
-            try:
-                logger.warning(f"无法使用指定字体 {font}，尝试默认字体。错误: {e}")
-                txt_clip = TextClip(
-                    text=text, 
-                    font_size=font_size, 
-                    color=color, 
-                    stroke_color=stroke_color, 
-                    stroke_width=stroke_width
-                )
-                txt_clip = txt_clip.with_start(start_time).with_duration(duration).with_position(text_position)
-                subtitle_clips.append(txt_clip)
-            except Exception as e2:
-                logger.error(f"创建字幕片段彻底失败: {e2}")
-                return None
+    # 光栅化是 CPU 密集型且全程持有 GIL（Pillow 的 FreeType 绘制不释放 GIL），分发到多个进程；
+    # 子进程只返回像素数组，主进程再包装成 ImageClip
+    texts = [text for text, _, _ in timed_subs]
+    workers = max(1, min(SUBTITLE_WORKERS, len(texts)))
+    render_args = (
+        texts,
+        [font] * len(texts),
+        [font_size] * len(texts),
+        [color] * len(texts),
+        [stroke_color] * len(texts),
+        [stroke_width] * len(texts)
+    )
+    try:
+        if workers == 1 or len(texts) < SUBTITLE_POOL_MIN:
+            # 单核或字幕条数少时，启动子进程的开销超过并行收益
+            frames = list(map(_render_text_frame, *render_args))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                frames = list(executor.map(
+                    _render_text_frame,
+                    *render_args,
+                    chunksize=max(1, len(texts) // (workers * 4))
+                ))
+    except Exception as e:
+        logger.error(f"创建字幕片段彻底失败: {e}")
+        return None
+
+    for (_, start_time, duration), (frame, mask) in zip(timed_subs, frames):
+        # 字幕位置 (底部)：底边距画面底边 SUBTITLE_BOTTOM_MARGIN，与 libass 的 MarginV 一致
+        text_position = ('center', video_height - SUBTITLE_BOTTOM_MARGIN - frame.shape[0])
+        txt_clip = ImageClip(frame).with_mask(ImageClip(mask, is_mask=True))
+        txt_clip = txt_clip.with_start(start_time).with_duration(duration).with_position(text_position)
+        subtitle_clips.append(txt_clip)
 
     return subtitle_clips
 
+def _render_text_frame(text, font, font_size, color, stroke_color, stroke_width):
+    """在子进程中渲染单条字幕，返回 (RGB 帧, 透明度遮罩) 两个数组"""
+    try:
+        # MoviePy v2.x TextClip - 单行模式
+        # 不使用 method 参数，默认就是单行渲染
+        # 配合字幕拆分（每句最多22字），确保不会换行
+        txt_clip = TextClip(
+            text=text, 
+            font_size=font_size, 
+            font=font, 
+            color=color, 
+            stroke_color=stroke_color, 
+            stroke_width=stroke_width
+        )
+    except Exception as e:
+        # 降级尝试：不使用 font 参数，使用默认字体
+        logger.warning(f"无法使用指定字体 {font}，尝试默认字体。错误: {e}")
+        txt_clip = TextClip(
+            text=text, 
+            font_size=font_size, 
+            color=color, 
+            stroke_color=stroke_color, 
+            stroke_width=stroke_width
+        )
+    return txt_clip.get_frame(0), txt_clip.mask.get_frame(0)
+
+def concat_image_clips(image_clips):
+    """拼接图片片段：尺寸一致时用 chain（无逐帧合成），否则回退 compose"""
+    first_size = tuple(image_clips[0].size)
+    if all(tuple(clip.size) == first_size for clip in image_clips):
+        return concatenate_videoclips(image_clips, method="chain")
+    logger.warning("图片尺寸不一致，使用 compose 方式拼接")
+    return concatenate_videoclips(image_clips, method="compose")
+
+@lru_cache(maxsize=None)
+def font_family_name(font_path):
+    """读取字体文件的 family 名（.ttc 取第一个字体，与 MoviePy 渲染时一致），读取失败返回 None"""
+    try:
+        return ImageFont.truetype(font_path, SUBTITLE_FONT_SIZE).getname()[0]
+    except OSError as e:
+        logger.warning(f"读取字体名失败 {font_path}: {e}")
+        return None
+
+def _ffmpeg_assemble(segments, audio_path, srt_path, out_path, audio_delay=0.0):
+    """直接用 ffmpeg 生成视频：concat demuxer 串联静态图片，libass 烧录字幕，不经过 Python 逐帧传像素
+
+    Args:
+        segments: [(图片路径, 时长秒)]
+        audio_path: 音频文件
+        srt_path: 字幕文件，不存在时不加字幕
+        out_path: 输出 mp4
+        audio_delay: 音频和字幕的延迟秒数（目录页时长）
+
+    Returns:
+        成功返回 True，失败返回 False（调用方回退到 MoviePy）
+    """
+    out_path = Path(out_path)
+    list_path = out_path.with_suffix(".concat.txt")
+    entries = []
+    for path, duration in segments:
+        entries.append(concat_file_entry(path))
+        entries.append(f"duration {duration:.3f}")
+    # concat demuxer 会忽略最后一个条目的 duration，需要再重复一次最后一张图
+    entries.append(concat_file_entry(segments[-1][0]))
+    list_path.write_text("\n".join(entries) + "\n", encoding="utf-8")
+
+    with Image.open(segments[0][0]) as first_image:
+        width, height = first_image.size
+    # libx264 / yuv420p 要求偶数尺寸
+    filters = [f"scale={width - width % 2}:{height - height % 2}", "fps=24"]
+
+    srt_path = Path(srt_path) if srt_path else None
+    if srt_path and srt_path.exists():
+        scale = ASS_PLAY_RES_Y / height
+        # 使用 MoviePy 同一个字体文件：fontsdir 指向其目录，FontName 取文件内的 family 名
+        font_path = find_chinese_font()
+        font_name = font_family_name(font_path) if font_path else None
+        # 描边宽度同样按 288 行坐标换算，与 MoviePy 的像素描边一致
+        style = (f"FontSize={round(SUBTITLE_FONT_SIZE * scale)},"
+                 f"PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,"
+                 f"Outline={SUBTITLE_STROKE_WIDTH * scale:.2f},"
+                 f"Alignment=2,MarginV={round(SUBTITLE_BOTTOM_MARGIN * scale)}")
+        if font_name:
+            style = f"FontName={font_name},{style}"
+        subtitles = (f"subtitles=filename={escape_filter_value(srt_path.name)}"
+                     f":force_style={escape_filter_value(style)}")
+        if font_path:
+            subtitles += f":fontsdir={escape_filter_value(Path(font_path).parent.as_posix())}"
+        if audio_delay > 0:
+            # 字幕时间轴从音频开头算起，先平移时间戳再烧录，烧录后再移回
+            subtitles = f"setpts=PTS-{audio_delay}/TB,{subtitles},setpts=PTS+{audio_delay}/TB"
+        filters.append(subtitles)
+
+    audio_filter = []
+    if audio_delay > 0:
+        audio_filter = ["-af", f"adelay=delays={int(audio_delay * 1000)}:all=1"]
+
+    codec, codec_params = pick_video_codec()
+    if "-pix_fmt" not in codec_params:
+        codec_params = codec_params + ["-pix_fmt", "yuv420p"]
+    if codec == "libx264":
+        codec_params = codec_params + ["-preset", "medium"]
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", str(list_path.resolve()),
+        "-i", str(Path(audio_path).resolve()),
+        "-map", "0:v", "-map", "1:a",
+        "-vf", ",".join(filters),
+        *audio_filter,
+        "-c:v", codec, *codec_params,
+        "-c:a", "aac",
+        str(out_path.resolve())
+    ]
+    try:
+        # 在字幕所在目录运行，subtitles 滤镜只需文件名，避免滤镜参数里的路径转义问题
+        result = subprocess.run(cmd, capture_output=True, cwd=str(srt_path.parent) if srt_path else None)
+    except OSError as e:
+        logger.warning(f"无法调用 ffmpeg: {e}")
+        return False
+    finally:
+        list_path.unlink(missing_ok=True)
+
+    if result.returncode != 0:
+        logger.warning(f"ffmpeg 直接合成失败: {result.stderr.decode('utf-8', 'ignore').strip()}")
+        return False
+    return True
+
 def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir="audio"):
     """使用 MoviePy 创建新闻视频"""
     final_output = output_dir / f"video_{output_name}.mp4"
@@ -148,18 +331,28 @@ def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir=
         return False
 
     # 2. 准备视频片段 (图片)
-    image_clips = []
+    # 先收集 (图片路径, 时长)，时长全部确定后再创建片段并只拼接一次
+    segments = []
+    
+    # 一次 scandir 拿到目录下所有 png，代替逐张 exists() 的 stat 调用
+    images_dir = Path(images_dir)
+    try:
+        with os.scandir(images_dir) as entries:
+            available_images = {entry.name for entry in entries if entry.name.endswith(".png") and entry.is_file()}
+    except FileNotFoundError:
+        logger.error(f"图片目录不存在: {images_dir}")
+        audio_clip.close()
+        return False
     
     # 首先检查是否有目录页 (index.png)，如果有则添加到开头
-    index_image_path = Path(images_dir) / "index.png"
+    index_image_path = images_dir / "index.png"
     index_duration = 0  # 记录目录页时长，用于调整音频起始时间
     
-    if index_image_path.exists():
+    if index_image_path.name in available_images:
         # 目录页显示2秒
         index_duration = 2.0
         logger.info(f"找到目录页 index.png，将在开头显示 {index_duration} 秒")
-        index_clip = ImageClip(str(index_image_path)).with_duration(index_duration)
-        image_clips.append(index_clip)
+        segments.append((index_image_path, index_duration))
     
     # 然后处理新闻页面
     news_count = len(data['timeline'])
@@ -167,27 +360,42 @@ def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir=
     
     for i in range(news_count):
         news = data['timeline'][i]
-        image_path = Path(images_dir) / f"news_{i+1}.png"
+        image_path = images_dir / f"news_{i+1}.png"
         
-        if not image_path.exists():
+        if image_path.name not in available_images:
             logger.warning(f"图片不存在: {image_path}")
             continue
             
         # 计算时长
         start_seconds = time_str_to_seconds(news['start_seconds'])
         end_seconds = time_str_to_seconds(news['end_seconds'])
-        duration = end_seconds - start_seconds
-        
-        # 创建图片片段
-        img_clip = ImageClip(str(image_path)).with_duration(duration)
-        image_clips.append(img_clip)
+        segments.append((image_path, end_seconds - start_seconds))
 
-    if not image_clips:
+    if not segments:
         logger.error("没有有效的图片片段")
         return False
 
-    # 3. 拼接视频
-    video_clip = concatenate_videoclips(image_clips, method="compose")
+    # 检查视频时长是否足够（目录页 + 音频），不足则延长最后一帧
+    total_required_duration = index_duration + audio_clip.duration
+    video_duration = sum(duration for _, duration in segments)
+    if video_duration < total_required_duration:
+        diff = total_required_duration - video_duration
+        logger.info(f"视频时长不足，延长最后一帧 {diff:.2f} 秒")
+        last_path, last_duration = segments[-1]
+        segments[-1] = (last_path, last_duration + diff)
+
+    # 3. 优先用 ffmpeg 直接合成，失败再回退到 MoviePy
+    subtitle_path = Path(audio_dir) / f"subtitle_{output_name}.srt"
+    logger.info("正在使用 ffmpeg 合成视频...")
+    if _ffmpeg_assemble(segments, audio_path, subtitle_path, final_output, audio_delay=index_duration):
+        audio_clip.close()
+        logger.info(f"✅ 视频生成成功: {final_output}")
+        return True
+    logger.warning("ffmpeg 直接合成失败，回退到 MoviePy")
+
+    # 拼接视频
+    image_clips = [ImageClip(str(path)).with_duration(duration) for path, duration in segments]
+    video_clip = concat_image_clips(image_clips)
     
     # 4. 设置音频
     # 如果有目录页，音频需要延迟开始
@@ -195,20 +403,10 @@ def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir=
         logger.info(f"音频将延迟 {index_duration} 秒开始播放（目录页期间静音）")
         audio_clip = audio_clip.with_start(index_duration)
     
-    # 检查视频时长是否足够
-    total_required_duration = index_duration + audio_clip.duration
-    if video_clip.duration < total_required_duration:
-        diff = total_required_duration - video_clip.duration
-        logger.info(f"视频时长不足，延长最后一帧 {diff:.2f} 秒")
-        last_clip = image_clips[-1].with_duration(image_clips[-1].duration + diff)
-        image_clips[-1] = last_clip
-        video_clip = concatenate_videoclips(image_clips, method="compose")
-    
     # 合成音频到视频
     video_clip = video_clip.with_audio(audio_clip)
     
     # 5. 添加字幕
-    subtitle_path = Path(audio_dir) / f"subtitle_{output_name}.srt"
     subtitle_elements = []
     
     if subtitle_path.exists():
@@ -229,14 +427,17 @@ def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir=
     
     final_clip = CompositeVideoClip([video_clip] + subtitle_elements)
     
+    codec, ffmpeg_params = pick_video_codec()
+    
     try:
         final_clip.write_videofile(
             str(final_output),
             fps=24,
-            codec='libx264',
+            codec=codec,
             audio_codec='aac',
-            preset='medium', 
+            preset='medium',  # 仅对 libx264 生效，硬件编码器的预设在 ffmpeg_params 中覆盖
             threads=4,
+            ffmpeg_params=ffmpeg_params or None,
             logger=None 
         )
         logger.info(f"✅ 视频生成成功: {final_output}")
@@ -255,15 +456,10 @@ def create_news_video(json_path, images_dir, output_name, output_dir, audio_dir=
 
 async def main():
     """主函数"""
-    output_dir = get_output_base_dir()
-    
-    date_dirs = sorted([d for d in output_dir.glob("*") if d.is_dir() and d.name.isdigit()], 
-                      reverse=True)
-    
-    if not date_dirs:
+    latest_dir = get_latest_output_dir()
+    if latest_dir is None:
         return False
         
-    latest_dir = date_dirs[0]
     logger.info(f"使用最新日期目录: {latest_dir}")
     
     json_files = list(latest_dir.glob("*.json"))
@@ -274,20 +470,12 @@ async def main():
     images_dir = latest_dir / "images"
     output_name = latest_dir.name
     
-    # 检查是否安装了 pysrt
-    try:
-        import pysrt
-    except ImportError:
-        import subprocess
-        logger.info("正在安装 pysrt...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pysrt"])
-    
-    return create_news_video(json_path, images_dir, output_name, 
-                        output_dir=latest_dir,
-                        audio_dir=str(latest_dir))
+    # MoviePy 是同步阻塞的，放到线程里执行，不占用事件循环
+    return await asyncio.to_thread(create_news_video, json_path, images_dir, output_name,
+                                   output_dir=latest_dir,
+                                   audio_dir=str(latest_dir))
 
 if __name__ == "__main__":
-    import asyncio
     try:
         success = asyncio.run(main())
     except Exception as e:
@@ -11,13 +11,18 @@ sys.path.append(str(project_root))
 import re
 import logging
 import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, date
 from pydub import AudioSegment
+from mutagen.mp3 import MP3
 from dotenv import load_dotenv
 
 # Import Minimax client
 from utils.minimax_client import MinimaxTTS, SubtitleGenerator
-from utils.paths import get_log_file_path, get_output_dir
+from utils.retry import call_with_retry, is_rejected_request
+from utils.ffmpeg_escape import concat_file_entry
+from utils.paths import get_log_file_path, get_output_dir, get_cache_dir
 
 # 加载环境变量
 load_dotenv()
@@ -27,10 +32,32 @@ logging.basicConfig(
     level=logging.DEBUG,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(get_log_file_path("md2audio")),
+        logging.FileHandler(get_log_file_path("md2audio"), delay=True),
         logging.StreamHandler()
     ]
 )
+logger = logging.getLogger(__name__)
+
+# 文本预处理用到的正则（模块加载时编译一次）
+ACRONYM_RE = re.compile(r'(?:[A-Z]\.){2,}[A-Z]?\.?')  # S.T.A.L.K.E.R.
+MD_LINK_RE = re.compile(r'\[(.*?)\][ ]*\(.*?\)')  # [文本](链接)
+OBSIDIAN_IMG_RE = re.compile(r'!\[\[.*?\]\]')  # ![[图片.png]]
+MD_IMG_RE = re.compile(r'!\[.*?\][ ]*\(.*?\)')  # ![alt](url)
+SENTENCE_DOT_RE = re.compile(r'([.])(?=\s|$)')  # 句末英文句点
+WHITESPACE_RE = re.compile(r'\s+')
+FILENAME_ILLEGAL_RE = re.compile(r'["\'\s\\/:*?"<>|]')
+TITLE_INNER_DOT_RE = re.compile(r'\.([A-Z])\.')
+TITLE_LETTER_DOT_RE = re.compile(r'([A-Z])\.([A-Z])')
+TITLE_DOTS_RE = re.compile(r'\.+')
+SECTION_RE = re.compile(r'##\s+(.*?)(?=\n##|\Z)', re.DOTALL)  # ## 标题及其内容
+
+# 同时进行的 Minimax 合成任务数
+TTS_CONCURRENCY = int(os.getenv("MD2AUDIO_CONCURRENCY", "4"))
+
+# 与 MinimaxTTS.submit_tts_task 的 audio_setting 保持一致，拼接时按同样参数重新编码
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_CHANNELS = 2
+AUDIO_BITRATE = "256k"
 
 def format_time(milliseconds):
     """将毫秒转换为SRT格式的时间字符串 (HH:MM:SS,mmm)"""
@@ -39,32 +66,91 @@ def format_time(milliseconds):
     minutes, seconds = divmod(remainder, 60)
     return f"{hours:02}:{minutes:02}:{seconds:02},{milliseconds % 1000:03}"
 
-def generate_silence(duration=1000):
-    """生成指定时长的无声音频（默认1秒）"""
-    return AudioSegment.silent(duration=duration)  # 确保精确指定毫秒
+def get_silence_path(duration=1000):
+    """返回指定时长（默认1秒）的静音 mp3 路径，首次调用时用 ffmpeg 生成并缓存
+    
+    采样率和声道与 TTS 输出一致，可直接放进 concat 列表。
+    """
+    silence_path = get_cache_dir() / f"silence_{duration}ms.mp3"
+    if silence_path.exists():
+        return silence_path
+    
+    layout = "stereo" if AUDIO_CHANNELS == 2 else "mono"
+    tmp_path = silence_path.with_suffix(".tmp.mp3")
+    result = subprocess.run(
+        [AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error",
+         "-f", "lavfi", "-i", f"anullsrc=r={AUDIO_SAMPLE_RATE}:cl={layout}",
+         "-t", f"{duration / 1000:.3f}", "-c:a", "libmp3lame", "-b:a", AUDIO_BITRATE,
+         str(tmp_path)],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        tmp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg 生成静音失败: {result.stderr.decode('utf-8', 'ignore').strip()}")
+    # 先写临时文件再改名，避免中断后留下不完整的缓存
+    tmp_path.replace(silence_path)
+    return silence_path
+
+def mp3_duration_ms(mp3_path):
+    """读取 mp3 的实际播放时长（毫秒，四舍五入）
+
+    只读 MPEG 帧头和 LAME 信息帧，不解码整段音频；已扣除编码器延迟和末尾填充。
+    """
+    return round(MP3(str(mp3_path)).info.length * 1000)
+
+def concat_mp3_files(mp3_paths, output_path):
+    """用 ffmpeg concat demuxer 拼接 mp3 并重新编码（流式处理，不把整段 PCM 读入内存）
+
+    不能用 -c copy：直接拷贝帧会保留每段的编码器延迟、末尾填充和 Xing/Info 帧，
+    实际播放时长比各段时长之和更长，字幕会逐段向后漂移。解码后再编码会去掉这些填充，
+    拼接结果与按各段实际时长累计的时间轴一致。
+    """
+    output_path = Path(output_path)
+    list_path = output_path.with_suffix(".concat.txt")
+    entries = [concat_file_entry(mp3_path) for mp3_path in mp3_paths]
+    list_path.write_text("\n".join(entries) + "\n", encoding="utf-8")
+    
+    try:
+        result = subprocess.run(
+            [AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error",
+             "-f", "concat", "-safe", "0", "-i", str(list_path),
+             "-c:a", "libmp3lame", "-b:a", AUDIO_BITRATE,
+             "-ar", str(AUDIO_SAMPLE_RATE), "-ac", str(AUDIO_CHANNELS),
+             str(output_path)],
+            capture_output=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg 拼接失败: {result.stderr.decode('utf-8', 'ignore').strip()}")
+    finally:
+        list_path.unlink(missing_ok=True)
+
+def _debug_text(label, text):
+    """输出预处理中间结果（超过100字截断）；未开启 DEBUG 时不做任何切片和格式化"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s%s", label, text[:100], "..." if len(text) > 100 else "")
 
 def preprocess_text(text):
     """预处理文本，处理链接和图片等Markdown元素"""
-    logging.debug(f"预处理前的文本: {text[:100]}..." if len(text) > 100 else f"预处理前的文本: {text}")
+    _debug_text("预处理前的文本", text)
     
     # 处理类似 S.T.A.L.K.E.R. 这样的缩写（连续的单字母+点），转换为没有点的形式
     # 例如: S.T.A.L.K.E.R. -> STALKER, G.A.M.M.A. -> GAMMA
     def remove_dots_from_acronym(match):
         return match.group(0).replace('.', '')
-    text = re.sub(r'(?:[A-Z]\.){2,}[A-Z]?\.?', remove_dots_from_acronym, text)
-    logging.debug(f"处理缩写后: {text[:100]}..." if len(text) > 100 else f"处理缩写后: {text}")
+    text = ACRONYM_RE.sub(remove_dots_from_acronym, text)
+    _debug_text("处理缩写后", text)
     
     # 处理链接 [文本](链接) -> 文本
     # 匹配 Markdown 链接，包括带空格的格式
-    text = re.sub(r'\[(.*?)\][ ]*\(.*?\)', r'\1', text)
-    logging.debug(f"处理链接后: {text[:100]}..." if len(text) > 100 else f"处理链接后: {text}")
+    text = MD_LINK_RE.sub(r'\1', text)
+    _debug_text("处理链接后", text)
     
     # 处理 Obsidian 格式图片，完全移除 ![[图片.png]]
-    text = re.sub(r'!\[\[.*?\]\]', '', text)
+    text = OBSIDIAN_IMG_RE.sub('', text)
     
     # 处理标准 Markdown 格式图片，完全移除 ![alt](url)
-    text = re.sub(r'!\[.*?\][ ]*\(.*?\)', '', text)
-    logging.debug(f"处理图片后: {text[:100]}..." if len(text) > 100 else f"处理图片后: {text}")
+    text = MD_IMG_RE.sub('', text)
+    _debug_text("处理图片后", text)
     
     # 将'-'替换为空格
     text = text.replace('-', ' ')
@@ -73,31 +159,55 @@ def preprocess_text(text):
     text = text.replace('"', '"').replace('"', '"')
     
     # 处理英文句点，将其转换为中文句号
-    text = re.sub(r'([.])(?=\s|$)', '。', text)
+    text = SENTENCE_DOT_RE.sub('。', text)
     
     # 移除多余空白字符
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = WHITESPACE_RE.sub(' ', text).strip()
     
-    logging.debug(f"最终预处理结果: {text[:100]}..." if len(text) > 100 else f"最终预处理结果: {text}")
+    _debug_text("最终预处理结果", text)
     
     return text
 
 def sanitize_filename(filename):
     """处理文件名，移除或替换非法字符"""
     # 将引号、空格和其他特殊字符替换为下划线
-    filename = re.sub(r'["\'\s\\/:*?"<>|]', '_', filename)
+    filename = FILENAME_ILLEGAL_RE.sub('_', filename)
     return filename
 
 def sanitize_title_for_tts(title):
     """清理标题，移除可能导致 TTS 失败的字符"""
     # 处理类似 S.T.A.L.K.E.R. 这样的缩写（连续的单字母+点）
     # 转换为没有点的形式
-    title = re.sub(r'\.([A-Z])\.', r'\1', title)  # 移除字母之间的点
-    title = re.sub(r'([A-Z])\.([A-Z])', r'\1\2', title)  # 再次处理
-    title = re.sub(r'\.+', ' ', title)  # 多个点替换为空格
-    title = re.sub(r'\s+', ' ', title).strip()  # 清理多余空格
+    title = TITLE_INNER_DOT_RE.sub(r'\1', title)  # 移除字母之间的点
+    title = TITLE_LETTER_DOT_RE.sub(r'\1\2', title)  # 再次处理
+    title = TITLE_DOTS_RE.sub(' ', title)  # 多个点替换为空格
+    title = WHITESPACE_RE.sub(' ', title).strip()  # 清理多余空格
     return title
 
+def synthesize_section(tts, text_path, audio_path):
+    """上传章节文本并等待 Minimax 合成完成，音频下载到 audio_path（可在线程中并发调用）
+
+    上传和创建任务是 POST，会话层不重试；这里只在服务端返回 429/503（请求未被受理）时退避重试。
+    """
+    def upload():
+        return call_with_retry(lambda: tts.upload_file(str(text_path)), is_transient=is_rejected_request)
+
+    def submit(file_id):
+        return call_with_retry(lambda: tts.submit_tts_task(file_id), is_transient=is_rejected_request)
+
+    file_id = upload()
+    try:
+        task_id = submit(file_id)
+    except FileNotFoundError as e:
+        # 缓存的 file_id 在服务端已失效：丢弃缓存后重新上传一次
+        logger.warning(f"文件 {text_path.name} 的 file_id 已失效，重新上传: {e}")
+        tts.forget_upload(str(text_path))
+        file_id = upload()
+        task_id = submit(file_id)
+    result_file_id = tts.wait_for_completion(task_id)
+    tts.download_file(result_file_id, str(audio_path))
+    return audio_path
+
 def save_timeline(timeline_data, current_date, output_dir):
     """保存时间轴数据到JSON文件"""
     timeline_path = output_dir / f"timeline_{current_date}.json"
@@ -106,119 +216,125 @@ def save_timeline(timeline_data, current_date, output_dir):
     }
     with open(timeline_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
-    logging.info(f"时间轴数据已保存到: {timeline_path}")
+    logger.info(f"时间轴数据已保存到: {timeline_path}")
 
 def parse_markdown_and_generate_audio(markdown_content):
     """解析Markdown内容，提取标题和文本，生成语音和字幕"""
-    logging.info("开始解析Markdown内容")
+    logger.info("开始解析Markdown内容")
     
     # 初始化 Minimax
     api_key = os.getenv("MINIMAX_API_KEY")
     if not api_key:
-        logging.error("未找到 MINIMAX_API_KEY 环境变量")
+        logger.error("未找到 MINIMAX_API_KEY 环境变量")
         print("Error: MINIMAX_API_KEY is required in .env file")
         return
 
     try:
-        tts = MinimaxTTS(api_key=api_key)
+        tts = MinimaxTTS(api_key=api_key, upload_cache_path=get_cache_dir() / "minimax_uploads.json")
         subtitle_gen = SubtitleGenerator()
     except Exception as e:
-        logging.error(f"Minimax初始化失败: {e}")
+        logger.error(f"Minimax初始化失败: {e}")
         return
 
     # 初始化时间轴数据
     timeline_data = []
     
-    # 获取第一个标题作为主文件名
-    first_title_match = re.search(r'##\s+(.*?)(?=\n)', markdown_content)
-    if not first_title_match:
+    # 一次扫描找出所有## 开头的标题及其内容，第一个标题作为主文件名
+    sections = [m.group(1) for m in SECTION_RE.finditer(markdown_content)]
+    if not sections:
         main_title = "未命名文档"
     else:
-        main_title = first_title_match.group(1).strip()
+        main_title = sections[0].split('\n', 1)[0].strip()
     
-    logging.info(f"主标题: {main_title}")
+    logger.info(f"主标题: {main_title}")
     
     # 获取当前日期并创建输出目录
     current_date = date.today().strftime("%Y%m%d")
     output_dir = get_output_dir()  # 使用统一的路径函数
-    logging.info(f"输出目录: {output_dir}")
-    
-    # 使用正则表达式找出所有## 开头的标题及其内容
-    sections = re.findall(r'##\s+(.*?)(?=\n##|\Z)', markdown_content, re.DOTALL)
-    logging.info(f"找到 {len(sections)} 个章节")
+    logger.info(f"输出目录: {output_dir}")
     
-    # 生成SRT文件内容
-    srt_content = []
-    current_time = 0  # 毫秒
-    sentence_index = 1
+    logger.info(f"找到 {len(sections)} 个章节")
     
-    # 创建一个合并的音频文件
-    combined_audio = AudioSegment.empty()
-    
-    # 处理所有章节
+    # 1. 预处理所有章节，写入供 Minimax 上传的临时文本
+    jobs = []  # (章节序号, 标题, 预处理后内容, 临时文本路径, 临时音频路径)
     for section_idx, section in enumerate(sections):
-        logging.info(f"处理章节 {section_idx+1}/{len(sections)}")
-        
         # 分离标题和内容
         lines = section.strip().split('\n')
         title = lines[0].strip()
-        logging.info(f"章节标题: {title}")
+        logger.info(f"章节 {section_idx+1}/{len(sections)} 标题: {title}")
         
         # 排除标题行，只保留内容
         content = '\n'.join(lines[1:]).strip()
         
         if not content:
-            logging.warning(f"章节 '{title}' 没有内容，跳过")
+            logger.warning(f"章节 '{title}' 没有内容，跳过")
             continue
         
         # 预处理内容
         preprocessed_content = preprocess_text(content)
-        logging.info(f"章节预处理后内容: {preprocessed_content[:100]}...")
-        
-        # 记录章节开始时间
-        section_start_time = format_time(current_time)
+        logger.info(f"章节预处理后内容: {preprocessed_content[:100]}...")
         
-        # 生成临时文件用于Minimax上传
+        # 生成临时文件用于Minimax上传（带序号，避免同名标题在并发时互相覆盖）
         safe_title = sanitize_filename(title)
-        temp_txt_path = output_dir / f"temp_{safe_title}.txt"
-        temp_audio_path = output_dir / f"temp_{safe_title}.mp3"
+        temp_txt_path = output_dir / f"temp_{section_idx}_{safe_title}.txt"
+        temp_audio_path = output_dir / f"temp_{section_idx}_{safe_title}.mp3"
         
         try:
-            # 1. 写入临时文本文件
             with open(temp_txt_path, "w", encoding="utf-8") as f:
                 f.write(preprocessed_content)
+        except Exception as e:
+            logger.error(f"处理章节 '{title}' 时出错: {e}")
+            continue
+        
+        jobs.append((section_idx, title, preprocessed_content, temp_txt_path, temp_audio_path))
+    
+    # 2. 各章节之间没有依赖，并发调用 Minimax 合成音频
+    logger.info(f"并发合成 {len(jobs)} 个章节音频（并发数 {TTS_CONCURRENCY}）")
+    with ThreadPoolExecutor(max_workers=TTS_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(synthesize_section, tts, temp_txt_path, temp_audio_path)
+            for _, _, _, temp_txt_path, temp_audio_path in jobs
+        ]
+        # 上传和合成在线程中进行，主线程同时估算各章节字幕时间轴
+        estimated_timelines = [
+            subtitle_gen.generate_timeline(subtitle_gen.split_text_into_sentences(preprocessed_content))
+            for _, _, preprocessed_content, _, _ in jobs
+        ]
+    tts.close()
+    
+    # 3. 按原顺序拼接音频，根据实测时长生成字幕和时间轴
+    srt_content = []
+    current_time = 0  # 毫秒
+    sentence_index = 1
+    
+    # 按顺序记录要拼接的 mp3 片段（章节音频 + 停顿），最后一次性交给 ffmpeg
+    segment_paths = []
+    
+    for (section_idx, title, _, temp_txt_path, temp_audio_path), future, estimated_timeline in zip(jobs, futures, estimated_timelines):
+        # 记录章节开始时间
+        section_start_time = format_time(current_time)
+        
+        try:
+            future.result()
+            logger.info(f"Minimax 音频生成完成: {title}")
             
-            logging.info(f"调用Minimax生成音频: {title}")
-            
-            # 2. 调用Minimax API
-            file_id = tts.upload_file(str(temp_txt_path))
-            task_id = tts.submit_tts_task(file_id)
-            result_file_id = tts.wait_for_completion(task_id)
-            tts.download_file(result_file_id, str(temp_audio_path))
-            
-            logging.info("Minimax 音频生成完成")
-            
-            # 3. 读取音频获取准确时长
-            audio_segment = AudioSegment.from_file(temp_audio_path)
-            audio_duration_ms = len(audio_segment)
+            # 读取音频获取准确时长（与拼接后该段的实际时长一致）
+            audio_duration_ms = mp3_duration_ms(temp_audio_path)
             audio_duration_sec = audio_duration_ms / 1000.0
-            logging.info(f"音频时长: {audio_duration_ms}ms")
-            
-            # 4. 生成和校准字幕
-            sentences = subtitle_gen.split_text_into_sentences(preprocessed_content)
-            estimated_timeline = subtitle_gen.generate_timeline(sentences)
+            logger.info(f"音频时长: {audio_duration_ms}ms")
             
+            # 按实测时长校准字幕
             if estimated_timeline:
                 estimated_total_sec = estimated_timeline[-1]['end']
                 # 计算缩放因子
                 scale_factor = audio_duration_sec / estimated_total_sec if estimated_total_sec > 0 else 1.0
-                logging.info(f"字幕时间轴缩放因子: {scale_factor:.4f}")
+                logger.info(f"字幕时间轴缩放因子: {scale_factor:.4f}")
                 
                 # 生成SRT条目
                 for item in estimated_timeline:
                     # 应用缩放并加上当前累计时间
-                    start_ms = int(item['start'] * scale_factor * 1000) + current_time
-                    end_ms = int(item['end'] * scale_factor * 1000) + current_time
+                    start_ms = round(item['start'] * scale_factor * 1000) + current_time
+                    end_ms = round(item['end'] * scale_factor * 1000) + current_time
                     
                     # 确保结束时间不超过音频总时长+当前时间
                     # end_ms = min(end_ms, current_time + audio_duration_ms)
@@ -226,26 +342,27 @@ def parse_markdown_and_generate_audio(markdown_content):
                     srt_content.append(f"{sentence_index}\n{format_time(start_ms)} --> {format_time(end_ms)}\n{item['text']}\n")
                     sentence_index += 1
             
-            # 5. 合并音频
-            combined_audio += audio_segment
+            # 记录音频片段（临时 mp3 在拼接完成后再删除）
+            segment_paths.append(temp_audio_path)
             current_time += audio_duration_ms
             
-            # 6. 清理临时文件
-            if os.path.exists(temp_txt_path):
-                os.remove(temp_txt_path)
+        except Exception as e:
+            logger.error(f"处理章节 '{title}' 时出错: {e}")
             if os.path.exists(temp_audio_path):
                 os.remove(temp_audio_path)
-            
-        except Exception as e:
-            logging.error(f"处理章节 '{title}' 时出错: {e}")
             continue
+        finally:
+            # 清理临时文本
+            if os.path.exists(temp_txt_path):
+                os.remove(temp_txt_path)
             
         # 章节间隔停顿
         if section_idx < len(sections) - 1:
-            silence = generate_silence(1000)
-            combined_audio += silence
-            current_time += 1000
-            logging.debug("章节之间添加停顿: 1000毫秒")
+            silence_path = get_silence_path(1000)
+            silence_ms = mp3_duration_ms(silence_path)
+            segment_paths.append(silence_path)
+            current_time += silence_ms
+            logger.debug(f"章节之间添加停顿: {silence_ms}毫秒")
             
         # 记录章节结束时间 (包含停顿)
         section_end_time = format_time(current_time)
@@ -260,30 +377,41 @@ def parse_markdown_and_generate_audio(markdown_content):
             })
     
     # 保存合并的音频文件
+    combined_audio_path = output_dir / f"audio_{current_date}.mp3"
     try:
-        combined_audio_path = output_dir / f"audio_{current_date}.mp3"
-        logging.info(f"保存合并音频文件: {combined_audio_path}")
-        combined_audio.export(str(combined_audio_path), format="mp3")
-        logging.info("音频文件保存成功")
+        logger.info(f"保存合并音频文件: {combined_audio_path}")
+        if not segment_paths:
+            raise RuntimeError("没有可拼接的音频片段")
+        concat_mp3_files(segment_paths, combined_audio_path)
+        logger.info("音频文件保存成功")
+        # 校验字幕时间轴与合并音频的实际时长
+        combined_ms = mp3_duration_ms(combined_audio_path)
+        if abs(combined_ms - current_time) > 50:
+            logger.warning(f"合并音频时长 {combined_ms}ms 与字幕时间轴 {current_time}ms 相差超过 50ms")
     except Exception as e:
-        logging.error(f"保存合并音频文件时出错: {e}")
+        logger.error(f"保存合并音频文件时出错: {e}")
+    finally:
+        # 清理章节临时音频（缓存的静音文件保留复用）
+        for *_, temp_audio_path in jobs:
+            if os.path.exists(temp_audio_path):
+                os.remove(temp_audio_path)
     
     # 写入单个SRT文件
     try:
         srt_path = output_dir / f"subtitle_{current_date}.srt"
-        logging.info(f"保存字幕文件: {srt_path}")
+        logger.info(f"保存字幕文件: {srt_path}")
         with open(srt_path, "w", encoding="utf-8") as srt_file:
             srt_file.write("\n".join(srt_content))
-        logging.info("字幕文件保存成功")
+        logger.info("字幕文件保存成功")
     except Exception as e:
-        logging.error(f"保存字幕文件时出错: {e}")
+        logger.error(f"保存字幕文件时出错: {e}")
     
     # 保存时间轴数据
     save_timeline(timeline_data, current_date, output_dir)
     
-    logging.info(f"已生成合并音频文件: {combined_audio_path}")
-    logging.info(f"已生成字幕文件: {srt_path}")
-    logging.info(f"已生成时间轴文件: {output_dir / f'timeline_{current_date}.json'}")
+    logger.info(f"已生成合并音频文件: {combined_audio_path}")
+    logger.info(f"已生成字幕文件: {srt_path}")
+    logger.info(f"已生成时间轴文件: {output_dir / f'timeline_{current_date}.json'}")
     
     print(f"已生成合并音频文件: {combined_audio_path}")
     print(f"已生成字幕文件: {srt_path}")
@@ -291,14 +419,14 @@ def parse_markdown_and_generate_audio(markdown_content):
 
 def process_markdown_file(file_path):
     """处理Markdown文件"""
-    logging.info(f"开始处理Markdown文件: {file_path}")
+    logger.info(f"开始处理Markdown文件: {file_path}")
     
     try:
         with open(file_path, "r", encoding="utf-8") as file:
             markdown_content = file.read()
-        logging.info(f"成功读取文件，内容长度: {len(markdown_content)} 字符")
+        logger.info(f"成功读取文件，内容长度: {len(markdown_content)} 字符")
     except Exception as e:
-        logging.error(f"读取文件时出错: {e}")
+        logger.error(f"读取文件时出错: {e}")
         return
     
     parse_markdown_and_generate_audio(markdown_content)
@@ -1,5 +1,7 @@
 """Convert markdown to HTML with timeline support."""
 import asyncio
+import hashlib
+import html
 import json
 import re
 import sys
@@ -7,7 +9,10 @@ import argparse
 import yaml
 import os
 import logging
+import httpx
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from datetime import datetime
@@ -20,22 +25,47 @@ sys.path.append(str(project_root))
 load_dotenv()
 
 # 导入公共模块
-from utils.paths import get_output_dir, get_log_file_path
-
-# 初始化日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(get_log_file_path("md2html"))
-    ]
-)
+from utils.paths import get_output_dir, get_cache_dir
+from utils.logging_setup import setup_queue_logging
+
+# 优先使用 libyaml 的 C 解析器，未编译 libyaml 时回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 logger = logging.getLogger(__name__)
 
 # 添加父目录到Python路径
 sys.path.append(str(Path(__file__).parent))
 
+# Markdown / HTML 解析用到的正则（模块加载时编译一次）
+DASHES_RE = re.compile(r'---+')  # 分隔线
+SECTION_SPLIT_RE = re.compile(r'(?m)^##\s+')  # 按 ## 标题切分
+TITLE_RE = re.compile(r'^## (.+?)(\n|$)')
+SUMMARY_RE = re.compile(r'<div class="summary">(.*?)</div>', re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')  # 模板占位符 {{NAME}}
+
+# 目录页布局：(新闻数量上限, (标题字号, 摘要字号, 卡片内边距, 网格间距, 摘要最大长度))，按上限升序
+INDEX_LAYOUTS = (
+    (4, (32, 24, 25, "30px 60px", 50)),      # 1-4条：标准布局
+    (6, (28, 22, 22, "25px 50px", 45)),      # 5-6条：略微缩小
+    (8, (26, 20, 20, "20px 40px", 38)),      # 7-8条：紧凑布局
+    (10, (24, 18, 18, "15px 35px", 32)),     # 9-10条：很紧凑
+)
+# 超过10条时的超紧凑布局
+INDEX_LAYOUT_OVERFLOW = (22, 16, 16, "12px 30px", 28)
+
+# 同时进行的 LLM 请求数（限流由信号量和客户端自带的重试退避控制）
+LLM_CONCURRENCY = int(os.getenv("MD2HTML_CONCURRENCY", "5"))
+
+# LLM 响应缓存：请求参数完全相同时直接复用上次生成的HTML（MD2HTML_CACHE=0 关闭）
+LLM_CACHE_ENABLED = os.getenv("MD2HTML_CACHE", "1") != "0"
+
+# LLM 客户端连接池：保持长连接，连接数留足余量，不让连接池成为并发瓶颈
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30.0)
+
 async def read_file_content(file_path: Path) -> str:
     """读取文件内容"""
     try:
@@ -44,10 +74,48 @@ async def read_file_content(file_path: Path) -> str:
         logger.error(f"无法读取文件 {file_path}: {e}")
         raise
 
+@lru_cache(maxsize=16)
+def _read_text_cached(path_str: str, mtime_ns: int) -> str:
+    """按 (路径, 修改时间) 缓存文件内容，文件变化后自动失效"""
+    return Path(path_str).read_text(encoding='utf-8')
+
+@lru_cache(maxsize=4)
+def _load_yaml_cached(path_str: str, mtime_ns: int) -> dict:
+    """按 (路径, 修改时间) 缓存 YAML 解析结果"""
+    with open(path_str, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+def read_template(path: Path) -> str:
+    """读取模板文件（同一进程内未修改的模板只读一次）"""
+    return _read_text_cached(str(path), path.stat().st_mtime_ns)
+
+def load_llm_config(path: Path) -> dict:
+    """读取 LLM 配置文件（同一进程内未修改的配置只解析一次，返回值不要修改）"""
+    return _load_yaml_cached(str(path), path.stat().st_mtime_ns)
+
+def fill_template(template: str, values: dict) -> str:
+    """一次扫描替换模板中的 {{NAME}} 占位符，values 中没有的占位符原样保留"""
+    return PLACEHOLDER_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
+def _llm_cache_path(completion_params: dict) -> Optional[Path]:
+    """按请求参数（模型、提示词、模板等）计算缓存文件路径；缓存关闭时返回 None"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    payload = json.dumps(completion_params, ensure_ascii=False, sort_keys=True)
+    key = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    return get_cache_dir() / "md2html" / f"{key}.html"
+
+def _write_llm_cache(cache_path: Path, html_content: str):
+    """原子写入缓存（先写临时文件再改名），避免留下不完整的缓存"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix('.tmp')
+    tmp_path.write_text(html_content, encoding='utf-8')
+    tmp_path.replace(cache_path)
+
 def parse_markdown_content(content: str) -> list:
     """解析Markdown内容为新闻条目列表"""
     # 移除分隔符
-    content = re.sub(r'---+', '', content)
+    content = DASHES_RE.sub('', content)
     
     if not content.strip().startswith('##'):
         if '##' in content:
@@ -55,13 +123,12 @@ def parse_markdown_content(content: str) -> list:
         else:
             content = f"## 单机游戏日报\n{content}"
     
-    sections = re.split(r'(?m)^##\s+', content)
+    sections = SECTION_SPLIT_RE.split(content)
     return [section.strip() for section in sections if section.strip()]
 
 async def save_html_page(html_content: str, file_path: Path):
-    """保存HTML页面"""
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    file_path.write_text(html_content, encoding='utf-8')
+    """保存HTML页面（目录需已存在；写盘放到线程中，不阻塞事件循环）"""
+    await asyncio.to_thread(file_path.write_text, html_content, encoding='utf-8')
     logger.info(f"已保存HTML页面到 {file_path}")
 
 async def create_index_page(titles: list, summaries: list, output_dir: Path, index_template: str):
@@ -71,26 +138,13 @@ async def create_index_page(titles: list, summaries: list, output_dir: Path, ind
     news_count = len(titles)
     logger.info(f"新闻数量: {news_count}，自动调整布局...")
     
-    # 根据新闻数量动态调整样式
-    # 布局配置：[新闻数量范围, 标题字号, 摘要字号, 卡片内边距, 网格间距, 摘要最大长度]
-    layout_configs = {
-        (1, 4): (32, 24, 25, "30px 60px", 50),      # 1-4条：标准布局
-        (5, 6): (28, 22, 22, "25px 50px", 45),      # 5-6条：略微缩小
-        (7, 8): (26, 20, 20, "20px 40px", 38),      # 7-8条：紧凑布局
-        (9, 10): (24, 18, 18, "15px 35px", 32),     # 9-10条：很紧凑
-    }
-    
-    # 选择合适的配置
-    title_size, summary_size, padding, gap, summary_len = (32, 24, 25, "30px 60px", 50)  # 默认值
-    for (min_count, max_count), config in layout_configs.items():
-        if min_count <= news_count <= max_count:
-            title_size, summary_size, padding, gap, summary_len = config
-            break
-    
-    # 如果新闻超过10条，使用最紧凑配置
-    if news_count > 10:
-        title_size, summary_size, padding, gap, summary_len = (22, 16, 16, "12px 30px", 28)
+    # 根据新闻数量动态调整样式：取第一个上限不小于新闻数量的布局
+    layout = next((config for max_count, config in INDEX_LAYOUTS if news_count <= max_count), None)
+    if layout is None:
+        # 如果新闻超过10条，使用最紧凑配置
+        layout = INDEX_LAYOUT_OVERFLOW
         logger.warning(f"新闻数量({news_count})过多，使用超紧凑布局，建议控制在10条以内")
+    title_size, summary_size, padding, gap, summary_len = layout
     
     # 生成动态CSS
     dynamic_css = f"""
@@ -111,14 +165,14 @@ async def create_index_page(titles: list, summaries: list, output_dir: Path, ind
     """
     
     # 生成新闻条目HTML
-    news_items_html = ""
+    news_item_parts = []
     for i, (title, summary) in enumerate(zip(titles, summaries), 1):
         clean_title = title.replace('##', '').strip() or f"新闻 {i}"
         # 根据新闻数量动态限制摘要长度
         if len(summary) > summary_len:
             summary = summary[:summary_len-3] + "..."
         
-        news_items_html += f'''
+        news_item_parts.append(f'''
             <div class="news-item">
                 <div class="news-number">{i:02d}</div>
                 <div class="news-content">
@@ -126,7 +180,8 @@ async def create_index_page(titles: list, summaries: list, output_dir: Path, ind
                     <div class="news-summary">{summary}</div>
                 </div>
             </div>
-'''
+''')
+    news_items_html = "".join(news_item_parts)
     
     # 替换模板占位符
     from datetime import datetime, timedelta
@@ -135,15 +190,16 @@ async def create_index_page(titles: list, summaries: list, output_dir: Path, ind
     tomorrow = datetime.now() + timedelta(days=1)
     date_str = f"{tomorrow.year}年{tomorrow.month:02d}月{tomorrow.day:02d}日 星期{weekdays[tomorrow.weekday()]}"
     
-    index_content = index_template.replace('{{DATE}}', date_str)
-    index_content = index_content.replace('{{NEWS_ITEMS}}', news_items_html)
-    
-    # 在 </head> 前插入动态CSS
-    index_content = index_content.replace('</head>', f'{dynamic_css}</head>')
+    # 动态CSS 通过 </head> 前的 {{DYNAMIC_CSS}} 占位符插入
+    index_content = fill_template(index_template, {
+        'DATE': date_str,
+        'NEWS_ITEMS': news_items_html,
+        'DYNAMIC_CSS': dynamic_css
+    })
     
     # 保存目录页
     index_path = output_dir / "index.html"
-    index_path.write_text(index_content, encoding='utf-8')
+    await save_html_page(index_content, index_path)
     logger.info(f"已保存目录页到 {index_path}（应用{news_count}条新闻的自适应布局）")
 
 async def generate_html_for_news(news_content: str, client: AsyncOpenAI, system_prompt: str, template: str, index: int) -> tuple[str, str]:
@@ -157,27 +213,32 @@ async def generate_html_for_news(news_content: str, client: AsyncOpenAI, system_
         # 显示明天的日期（因为是提前一天生成第二天的早报）
         tomorrow = datetime.now() + timedelta(days=1)
         date_str = f"{tomorrow.year}年{tomorrow.month:02d}月{tomorrow.day:02d}日 星期{weekdays[tomorrow.weekday()]}"
-        template = template.replace('{{DATE}}', date_str)
+        template = fill_template(template, {'DATE': date_str})
+        # 序号和标题同样是确定的，在 LLM 返回后由代码填入，LLM 只需生成摘要和正文
+        headline = news_content.strip().split('\n', 1)[0].lstrip('#').strip() or f"新闻 {index+1}"
+        local_values = {
+            'NUMBER': f"{index+1:02d}",
+            'TITLE': html.escape(headline, quote=False)
+        }
+        
+        # 模板放在系统消息里：同一批新闻的系统消息逐字节相同，可以命中服务端的前缀缓存
+        system_content = f"{system_prompt}\n\nHTML Template:\n{template}"
         
-        # 构建包含模板的用户提示词
+        # 用户提示词只包含每条新闻不同的部分
         user_prompt = f"""
-Task: Fill the provided HTML template with the news content.
+Task: Fill the HTML template from the system message with the news content.
 
-News Content:
+News {index+1:02d}:
 {news_content}
 
-HTML Template:
-{template}
-
 Requirements:
 1. Return the FULL HTML code.
 2. Do NOT change the CSS or structure of the template.
-3. Replace `{{{{NUMBER}}}}` with the number "{index+1:02d}".
-4. Replace `{{{{TITLE}}}}` with the news headline.
-5. Replace `{{{{SUMMARY}}}}` with a 1-sentence summary (around 30-40 Chinese characters).
-6. Replace `{{{{CONTENT}}}}` with the full news body (wrap paragraphs in <p> tags).
-7. Ensure all text is in Chinese.
-8. IMPORTANT: The content must fit within a single 1920x1080 page. Summarize the body text to approximately 100-200 Chinese characters to prevent overflow. Keep it concise.
+3. Keep `{{{{NUMBER}}}}` and `{{{{TITLE}}}}` exactly as they are; they are filled in afterwards.
+4. Replace `{{{{SUMMARY}}}}` with a 1-sentence summary (around 30-40 Chinese characters).
+5. Replace `{{{{CONTENT}}}}` with the full news body (wrap paragraphs in <p> tags).
+6. Ensure all text is in Chinese.
+7. IMPORTANT: The content must fit within a single 1920x1080 page. Summarize the body text to approximately 100-200 Chinese characters to prevent overflow. Keep it concise.
 """
 
         # 准备请求参数
@@ -186,33 +247,44 @@ Requirements:
             "temperature": 0.3,  # 降低温度以确保遵循模板
             "max_tokens": 4000,
             "messages": [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": system_content},
                 {"role": "user", "content": user_prompt}
             ]
         }
         
-        logger.info(f"正在请求 {client.model} API（新闻 {index+1}）...")
-        logger.info(f"超时设置: 300秒, 重试次数: 5次")
-        
-        response = await client.chat.completions.create(**completion_params)
-        clean_response = response.choices[0].message.content.strip()
-        logger.info(f"✅ API 响应成功，内容长度: {len(clean_response)} 字符")
-        
-        if clean_response.startswith("```html"):
-            clean_response = clean_response[7:]
-        elif clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        
-        clean_response = clean_response.strip()
+        cache_path = _llm_cache_path(completion_params)
+        from_cache = cache_path is not None and cache_path.exists()
+        if from_cache:
+            clean_response = await asyncio.to_thread(cache_path.read_text, encoding='utf-8')
+            logger.info(f"♻️ 命中LLM缓存（新闻 {index+1}）: {cache_path.name}")
+        else:
+            logger.info(f"正在请求 {client.model} API（新闻 {index+1}）...")
+            logger.info(f"超时设置: 300秒, 重试次数: 5次")
+            
+            response = await client.chat.completions.create(**completion_params)
+            clean_response = response.choices[0].message.content.strip()
+            logger.info(f"✅ API 响应成功，内容长度: {len(clean_response)} 字符")
+            
+            # 去掉 Markdown 代码块围栏（没有围栏时 removeprefix/removesuffix 不复制字符串）
+            if clean_response.startswith("```html"):
+                clean_response = clean_response.removeprefix("```html")
+            else:
+                clean_response = clean_response.removeprefix("```")
+            clean_response = clean_response.removesuffix("```").strip()
+            clean_response = fill_template(clean_response, local_values)
+
+        # 先校验是否为HTML，无效时不再做摘要提取
+        if not clean_response.startswith(("<!DOCTYPE", "<html")):
+            error_msg = f"❌ LLM返回的内容不是有效的HTML（新闻 {index+1}）"
+            logger.error(error_msg)
+            logger.error(f"返回内容: {clean_response[:200]}...")
+            raise ValueError(error_msg)
 
         # 提取摘要用于目录页
         summary = ""
-        summary_match = re.search(r'<div class="summary">(.*?)</div>', clean_response, re.DOTALL)
+        summary_match = SUMMARY_RE.search(clean_response)
         if summary_match:
-            summary = re.sub(r'<[^>]+>', '', summary_match.group(1)).strip()
+            summary = TAG_RE.sub('', summary_match.group(1)).strip()
         else:
             # 如果没找到，尝试从新闻内容提取第一句话
             lines = news_content.split('\n')
@@ -220,12 +292,10 @@ Requirements:
                 if line.strip() and not line.strip().startswith('#'):
                     summary = line.strip()[:40] + "..."
                     break
-
-        if not clean_response.startswith(("<!DOCTYPE", "<html")):
-            error_msg = f"❌ LLM返回的内容不是有效的HTML（新闻 {index+1}）"
-            logger.error(error_msg)
-            logger.error(f"返回内容: {clean_response[:200]}...")
-            raise ValueError(error_msg)
+        
+        # 只缓存通过校验的结果
+        if cache_path is not None and not from_cache:
+            await asyncio.to_thread(_write_llm_cache, cache_path, clean_response)
         
         return clean_response, summary
     except Exception as e:
@@ -256,6 +326,7 @@ async def main(content_path=None):
     else:
         content_path = Path(content_path)
 
+    http_client = None
     try:
         # 获取标准输出目录
         output_dir = get_output_dir("html")
@@ -266,14 +337,14 @@ async def main(content_path=None):
         # 读取HTML模板 - 新闻详情页模板
         detail_template_path = Path(project_root) / "templates" / "news_detail_template.html"
         if detail_template_path.exists():
-            detail_template_content = detail_template_path.read_text(encoding='utf-8')
+            detail_template_content = read_template(detail_template_path)
             logger.info(f"已加载新闻详情页模板: {detail_template_path}")
         else:
             logger.warning(f"未找到新闻详情页模板: {detail_template_path}，尝试使用旧模板")
             # 降级到旧模板
             old_template_path = Path(project_root) / "templates" / "news_template.html"
             if old_template_path.exists():
-                detail_template_content = old_template_path.read_text(encoding='utf-8')
+                detail_template_content = read_template(old_template_path)
                 logger.info(f"已加载旧模板: {old_template_path}")
             else:
                 detail_template_content = "<html><body><h1>Error: Template not found</h1></body></html>"
@@ -281,16 +352,15 @@ async def main(content_path=None):
         # 读取目录页模板
         index_template_path = Path(project_root) / "templates" / "index_template.html"
         if index_template_path.exists():
-            index_template_content = index_template_path.read_text(encoding='utf-8')
+            index_template_content = read_template(index_template_path)
             logger.info(f"已加载目录页模板: {index_template_path}")
         else:
             logger.warning(f"未找到目录页模板: {index_template_path}")
             index_template_content = None
 
         # 读取配置文件
-        with open('llmConfig.yaml', 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-            md2html_config = config['md2html']
+        config = load_llm_config(Path('llmConfig.yaml'))
+        md2html_config = config['md2html']
         
         # 从环境变量获取 API key
         api_key = os.getenv('LLM_API_KEY')
@@ -299,9 +369,11 @@ async def main(content_path=None):
         
         # 创建OpenAI客户端
         # DeepSeek-V3 模型较大，需要更长的超时时间
+        http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=httpx.Timeout(300.0, connect=10.0))
         client = AsyncOpenAI(
             base_url=md2html_config['base_url'],
             api_key=api_key,
+            http_client=http_client,
             timeout=300.0,   # 超时时间：5分钟（DeepSeek-V3需要更长时间）
             max_retries=5    # 重试次数：5次（确保成功）
         )
@@ -312,47 +384,47 @@ async def main(content_path=None):
         news_items = parse_markdown_content(md_content)
         logger.info(f"共解析出 {len(news_items)} 条新闻")
         
-        # 处理每条新闻
-        file_paths = []
-        titles = []
-        summaries = []
+        # 并发处理所有新闻，信号量限制同时进行的请求数
         total_news = len(news_items)
-        
+        titles = []
         for i, news_item in enumerate(news_items):
-            logger.info(f"\n{'='*60}")
-            logger.info(f"📰 处理进度: {i+1}/{total_news}")
-            logger.info(f"{'='*60}")
-            
-            title_match = re.search(r'^## (.+?)(\n|$)', news_item)
-            title = f"## {title_match.group(1).strip()}" if title_match else f"## 新闻 {i+1}"
-            titles.append(title)
-            
-            # 添加重试间隔（避免API速率限制）
-            if i > 0:
-                import asyncio
-                wait_time = 3  # 每个新闻之间等待3秒
-                logger.info(f"⏳ 等待 {wait_time} 秒后处理下一条新闻（避免API限流）...")
-                await asyncio.sleep(wait_time)
-            
-            # 生成并保存HTML，同时获取摘要
+            title_match = TITLE_RE.search(news_item)
+            titles.append(f"## {title_match.group(1).strip()}" if title_match else f"## 新闻 {i+1}")
+        
+        semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+        
+        async def process_news(i: int, news_item: str) -> str:
+            """生成并保存单条新闻的HTML，返回摘要"""
             try:
-                html_content, summary = await generate_html_for_news(
-                    news_item, 
-                    client, 
-                    md2html_config['system_prompt'], 
-                    detail_template_content,
-                    i
-                )
-                summaries.append(summary)
-                
-                file_path = output_dir / f"news_{i+1}.html"
-                await save_html_page(html_content, file_path)
-                file_paths.append(file_path)
+                # 信号量只限制 LLM 请求；写盘时已释放名额，下一条请求可以立即开始
+                async with semaphore:
+                    logger.info(f"📰 开始处理: {i+1}/{total_news}")
+                    html_content, summary = await generate_html_for_news(
+                        news_item, 
+                        client, 
+                        md2html_config['system_prompt'], 
+                        detail_template_content,
+                        i
+                    )
+                await save_html_page(html_content, output_dir / f"news_{i+1}.html")
                 logger.info(f"✅ 新闻 {i+1}/{total_news} 生成成功！")
-            except Exception as e:
+                return summary
+            except Exception:
                 logger.error(f"❌ 新闻 {i+1}/{total_news} 生成失败！")
                 logger.error(f"请检查 DeepSeek API 连接或切换到其他模型")
-                raise  # 失败时停止所有处理
+                raise  # 失败时取消其余任务，停止所有处理
+        
+        logger.info(f"并发生成HTML（并发数 {LLM_CONCURRENCY}）")
+        tasks = [asyncio.create_task(process_news(i, item)) for i, item in enumerate(news_items)]
+        try:
+            # gather 按原顺序返回摘要，任一任务失败时立即抛出第一个异常
+            summaries = await asyncio.gather(*tasks)
+        except BaseException:
+            # gather 不会取消其余任务：手动取消并等待它们结束，避免失败后继续请求 API
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
         
         # 创建目录页（如果有模板）
         if index_template_content:
@@ -361,7 +433,18 @@ async def main(content_path=None):
         logger.info("处理完成！")
     except Exception as e:
         logger.error(f"处理失败: {e}")
-        raise
+        raise e
+    finally:
+        if http_client is not None:
+            await http_client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # 单独运行时才初始化日志（控制台和文件由后台线程写入，并发生成时不阻塞事件循环）；
+    # 被 main.py 导入时沿用其已配置的日志，避免启动第二个监听线程
+    setup_queue_logging("md2html")
+    try:
+        import uvloop  # 可选依赖（仅 POSIX），安装后使用更快的事件循环
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -0,0 +1,27 @@
+"""FFmpeg escaping utilities for md2video package."""
+import re
+from pathlib import Path
+
+# 滤镜选项值中的特殊字符（选项之间用 : 分隔）
+_OPTION_SPECIAL_RE = re.compile(r"([\\':])")
+# 滤镜图中的特殊字符（滤镜之间用 , ; 分隔，[] 是连接标签）
+_FILTERGRAPH_SPECIAL_RE = re.compile(r"([\\'\[\],;])")
+
+
+def concat_file_entry(path) -> str:
+    """生成 concat demuxer 列表中的一行 file '...'
+
+    路径放在单引号内，其中的单引号写成 '\\''（结束引号、转义单引号、重新开始引号）。
+    """
+    escaped = Path(path).resolve().as_posix().replace("'", "'\\''")
+    return f"file '{escaped}'"
+
+
+def escape_filter_value(value) -> str:
+    """转义写入 -vf 的滤镜选项值
+
+    ffmpeg 先按滤镜图解析一次、再按选项解析一次，两层都要转义，
+    路径或字体名中的 : ' , 等字符才不会被当成分隔符。
+    """
+    escaped = _OPTION_SPECIAL_RE.sub(r"\\\1", str(value))
+    return _FILTERGRAPH_SPECIAL_RE.sub(r"\\\1", escaped)
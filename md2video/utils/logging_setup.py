@@ -0,0 +1,43 @@
+"""Logging utilities for md2video package."""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from utils.paths import get_log_file_path
+
+DEFAULT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_queue_logging(prefix: str, level: int = logging.INFO,
+                        fmt: str = DEFAULT_LOG_FORMAT, force: bool = False) -> QueueListener:
+    """配置根日志：调用方只把记录放入内存队列，由后台线程写控制台和日志文件
+
+    避免在 asyncio 事件循环中同步写磁盘。
+
+    Args:
+        prefix: 日志文件前缀 (如 'main', 'md2html')
+        level: 根日志级别
+        fmt: 日志格式（在入队前完成格式化）
+        force: 是否替换根日志上已有的 handler
+
+    Returns:
+        已启动的 QueueListener（进程退出时自动停止）
+    """
+    log_queue = queue.Queue(-1)
+    # 记录在 QueueHandler 中按 fmt 格式化，下游 handler 直接输出消息
+    listener = QueueListener(
+        log_queue,
+        logging.StreamHandler(),
+        logging.FileHandler(get_log_file_path(prefix)),
+        respect_handler_level=True
+    )
+    logging.basicConfig(
+        level=level,
+        format=fmt,
+        handlers=[QueueHandler(log_queue)],
+        force=force
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
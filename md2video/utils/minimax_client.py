@@ -1,44 +1,150 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import json
 import os
+import random
+import threading
 import time
 import re
+from itertools import accumulate
 from pathlib import Path
 
+# 上传文件扩展名对应的 MIME 类型
+MIME_TYPES = {
+    '.zip': 'application/zip',
+    '.txt': 'text/plain',
+    '.md': 'text/markdown',
+    '.json': 'application/json'
+}
+
+# GET（查询、下载）在连接错误、读超时、限流和5xx 时自动重试（指数退避，遵循 Retry-After）；其它4xx 直接失败。
+# POST（上传、创建计费任务）不是幂等的：urllib3 只对 allowed_methods 中的方法重试读错误和状态码，
+# 因此 POST 仅在连接未建立时重试，服务器可能已受理的请求不会被重放
+HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=1.0,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(["GET"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# 上传结果缓存有效期（秒），超过后重新上传
+UPLOAD_CACHE_TTL = 7 * 24 * 3600
+
+# 创建任务时服务端返回的"文件不存在/无效"类错误（缓存的 file_id 已被服务端清理）
+INVALID_FILE_RE = re.compile(r'file.*(not.?found|not.?exist|invalid|expired)|invalid.*file', re.IGNORECASE)
+
 class MinimaxTTS:
-    def __init__(self, api_key, base_url="https://api.minimaxi.com/v1"):
+    def __init__(self, api_key, base_url="https://api.minimaxi.com/v1", upload_cache_path=None):
         self.api_key = api_key
         self.base_url = base_url
+        # 相同内容的文件复用已上传的 file_id（None 表示不缓存）
+        self.upload_cache_path = Path(upload_cache_path) if upload_cache_path else None
+        self._upload_cache = None
+        self._upload_cache_lock = threading.Lock()
 
         if not self.api_key:
             raise ValueError("MINIMAX_API_KEY is required")
 
+        # 所有请求共用一个会话，上传、提交、轮询、下载复用 keep-alive 连接，避免每次重新握手
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {self.api_key}'
+        adapter = HTTPAdapter(max_retries=HTTP_RETRY)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        """关闭 HTTP 会话"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _file_digest(self, file_path):
+        """计算文件内容摘要（区分账号和接口地址）"""
+        h = hashlib.sha256(f"{self.base_url}|{self.api_key}|".encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _load_upload_cache(self):
+        """读取上传缓存（调用方持有锁）"""
+        if self._upload_cache is None:
+            try:
+                with open(self.upload_cache_path, 'r', encoding='utf-8') as f:
+                    self._upload_cache = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._upload_cache = {}
+        return self._upload_cache
+
+    def _cached_file_id(self, digest):
+        """返回未过期的缓存 file_id"""
+        with self._upload_cache_lock:
+            entry = self._load_upload_cache().get(digest)
+        if entry and time.time() - entry.get('uploaded_at', 0) < UPLOAD_CACHE_TTL:
+            return entry.get('file_id')
+        return None
+
+    def _write_upload_cache(self):
+        """原子写回缓存文件（调用方持有锁）"""
+        try:
+            self.upload_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.upload_cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._upload_cache, f)
+            os.replace(tmp_path, self.upload_cache_path)
+        except OSError as e:
+            print(f"Warning: failed to save upload cache: {e}")
+
+    def _save_file_id(self, digest, file_id):
+        """记录上传结果"""
+        with self._upload_cache_lock:
+            self._load_upload_cache()[digest] = {'file_id': file_id, 'uploaded_at': time.time()}
+            self._write_upload_cache()
+
+    def forget_upload(self, file_path):
+        """丢弃文件的缓存 file_id，下次 upload_file 时重新上传"""
+        if not self.upload_cache_path:
+            return
+        digest = self._file_digest(file_path)
+        with self._upload_cache_lock:
+            if self._load_upload_cache().pop(digest, None) is not None:
+                self._write_upload_cache()
+
     def upload_file(self, file_path):
-        """上传文件获取file_id"""
+        """上传文件获取file_id（内容相同且缓存未过期时直接复用）"""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Input file not found: {file_path}")
 
+        digest = None
+        if self.upload_cache_path:
+            digest = self._file_digest(file_path)
+            file_id = self._cached_file_id(digest)
+            if file_id:
+                print(f"Reusing uploaded file: {file_path}, file_id: {file_id}")
+                return file_id
+
         # 根据文件扩展名确定MIME类型
         file_extension = os.path.splitext(file_path)[1].lower()
-        mime_types = {
-            '.zip': 'application/zip',
-            '.txt': 'text/plain',
-            '.md': 'text/markdown',
-            '.json': 'application/json'
-        }
-        mime_type = mime_types.get(file_extension, 'application/octet-stream')
+        mime_type = MIME_TYPES.get(file_extension, 'application/octet-stream')
 
         url = f"{self.base_url}/files/upload"
         payload = {'purpose': 't2a_async_input'}
-        files = [
-            ('file', (os.path.basename(file_path), open(file_path, 'rb'), mime_type))
-        ]
-        headers = {
-            'Authorization': f'Bearer {self.api_key}'
-        }
 
         print(f"Uploading file: {file_path}")
-        response = requests.post(url, headers=headers, data=payload, files=files)
+        # 上传结束后立即关闭文件句柄
+        with open(file_path, 'rb') as f:
+            files = [
+                ('file', (os.path.basename(file_path), f, mime_type))
+            ]
+            response = self.session.post(url, data=payload, files=files, timeout=60)
         response.raise_for_status()
 
         result = response.json()
@@ -56,6 +162,8 @@ class MinimaxTTS:
             raise ValueError(f"Upload failed, no file_id. Response: {result}")
 
         print(f"File uploaded successfully, file_id: {file_id}")
+        if digest:
+            self._save_file_id(digest, file_id)
         return file_id
 
     def submit_tts_task(self, file_id):
@@ -88,33 +196,22 @@ class MinimaxTTS:
 
         payload["text_file_id"] = file_id
 
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-
         print("Submitting TTS task...")
         
-        # 增加重试逻辑
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(url, headers=headers, json=payload, timeout=30)
-                response.raise_for_status()
-                break
-            except requests.RequestException as e:
-                if attempt < max_retries - 1:
-                    print(f"Task submission failed ({attempt+1}/{max_retries}), retrying... Error: {e}")
-                    time.sleep(2)
-                else:
-                    raise e
+        # 仅连接失败时由会话的 HTTP_RETRY 重试，避免重复创建计费任务
+        response = self.session.post(url, json=payload, timeout=30)
+        response.raise_for_status()
 
         result = response.json()
 
         # Check API status
         base_resp = result.get('base_resp', {})
         if base_resp.get('status_code') != 0:
-            raise ValueError(f"API Error: {base_resp.get('status_msg', 'Unknown error')}")
+            status_msg = base_resp.get('status_msg', 'Unknown error')
+            if INVALID_FILE_RE.search(status_msg):
+                # 单独的异常类型，调用方据此丢弃缓存的 file_id 并重新上传
+                raise FileNotFoundError(f"API Error: {status_msg}")
+            raise ValueError(f"API Error: {status_msg}")
 
         # Get task_id
         task_id = result.get('task_id')
@@ -128,43 +225,53 @@ class MinimaxTTS:
         """查询任务状态"""
         url = f"{self.base_url}/query/t2a_async_query_v2"
         params = {'task_id': task_id}
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'content-type': 'application/json'
-        }
 
-        response = requests.get(url, headers=headers, params=params)
+        response = self.session.get(url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
-    def wait_for_completion(self, task_id, max_attempts=240, delay=3):
-        """等待任务完成（默认最长约12分钟：240次×3秒）"""
+    def wait_for_completion(self, task_id, total_timeout=720, base_delay=0.5, max_delay=10.0, jitter=0.5):
+        """等待任务完成（默认最长12分钟）
+
+        提交后立即查询一次，之后正常轮询的间隔从 base_delay 起按2倍递增（0.5、1、2、4、8 秒…），
+        短任务能在一秒左右返回，长任务逐渐放慢，最长 max_delay 秒；查询出错时按连续失败次数单独退避，
+        查询恢复后重新计数。每次等待都乘以 1~1+jitter 的随机系数，避免多个任务同时轮询。
+        """
         print("Waiting for task completion...")
-        for attempt in range(max_attempts):
+        deadline = time.monotonic() + total_timeout
+        poll_count = 0
+        fail_count = 0
+        while True:
             try:
                 result = self.query_task_status(task_id)
                 
                 base_resp = result.get('base_resp', {})
                 if base_resp.get('status_code') != 0:
                     raise RuntimeError(f"API Query Failed: {base_resp.get('status_msg', 'Unknown error')}")
-
+            except Exception as e:
+                # 查询失败（网络错误、限流等）视为暂时性错误，按失败次数退避后重试
+                fail_count += 1
+                print(f"Error querying status ({fail_count}): {e}")
+                wait = min(max_delay, base_delay * 2 ** fail_count)
+            else:
+                fail_count = 0
                 status = result.get('status')
 
                 if status == 'Success':
                     file_id = result.get('file_id')
                     print("Task Completed!")
                     return file_id
-                elif status == 'Processing':
-                    # print(f"Processing... ({attempt + 1}/{max_attempts})")
-                    pass
                 elif status in ['Failed', 'Cancel']:
+                    # 任务本身失败，继续轮询没有意义
                     raise RuntimeError(f"Task Failed: {status}")
-                
-            except Exception as e:
-                print(f"Error querying status: {e}")
 
-            if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait = min(max_delay, base_delay * 2 ** poll_count)
+                poll_count += 1
+
+            wait *= 1 + random.uniform(0, jitter)
+            if time.monotonic() + wait > deadline:
+                break
+            time.sleep(wait)
 
         raise TimeoutError("Task Timeout")
 
@@ -172,9 +279,6 @@ class MinimaxTTS:
         """下载合成结果"""
         url = f"{self.base_url}/files/retrieve_content"
         params = {'file_id': file_id}
-        headers = {
-            'Authorization': f'Bearer {self.api_key}'
-        }
 
         print(f"Downloading file to: {output_filename}")
         
@@ -182,12 +286,20 @@ class MinimaxTTS:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.get(url, headers=headers, params=params, timeout=60)
-                response.raise_for_status()
+                # 流式下载，边收边写盘，不把整个 mp3 读入内存
+                # 连接超时10秒；读超时按相邻两个数据块之间的间隔计算
+                total = 0
+                with self.session.get(url, params=params, timeout=(10, 120), stream=True) as response:
+                    response.raise_for_status()
+                    with open(output_filename, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            if chunk:
+                                f.write(chunk)
+                                total += len(chunk)
                 
                 # 验证内容长度是否有效（简单判断）
-                if len(response.content) < 100: # 如果文件太小可能是错误信息
-                    print(f"Warning: Downloaded file size is very small ({len(response.content)} bytes)")
+                if total < 100: # 如果文件太小可能是错误信息
+                    print(f"Warning: Downloaded file size is very small ({total} bytes)")
                 
                 break
             except requests.RequestException as e:
@@ -197,14 +309,19 @@ class MinimaxTTS:
                 else:
                     raise e
 
-        with open(output_filename, 'wb') as f:
-            f.write(response.content)
-
         return output_filename
 
 class SubtitleGenerator:
     """字幕生成器 - 根据文本和语速生成SRT字幕文件"""
 
+    # 句读标点（切分时保留在前一句末尾）
+    SENTENCE_END_RE = re.compile(r'[，。！？；：,!.?;:]')
+    # 非有效字符（标点、空白等），估算时长时去除
+    NON_EFFECTIVE_CHAR_RE = re.compile(r'[^\u4e00-\u9fa5a-zA-Z0-9]')
+    # 优先拆分点：逗号、顿号、冒号、分号；强制拆分时还可以退到空格
+    SPLIT_CHARS = frozenset('，、：；,;')
+    FALLBACK_SPLIT_CHARS = SPLIT_CHARS | frozenset(' 　')
+
     def __init__(self, chars_per_second=4.5):
         self.chars_per_second = chars_per_second
 
@@ -215,19 +332,24 @@ class SubtitleGenerator:
             text: 输入文本
             max_length: 单行字幕最大字符数（默认22，适合1920宽度视频）
         """
-        # 第一步：按主要标点符号切分
-        sentences = re.split(r'(?<=[，。！？；：,!.?;:])', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        # 第二步：对过长的句子进行二次拆分
         final_sentences = []
-        for sentence in sentences:
+        
+        def add(sentence):
+            sentence = sentence.strip()
+            if not sentence:
+                return
             if len(sentence) <= max_length:
                 final_sentences.append(sentence)
             else:
                 # 句子过长，需要智能拆分
-                parts = self._split_long_sentence(sentence, max_length)
-                final_sentences.extend(parts)
+                final_sentences.extend(self._split_long_sentence(sentence, max_length))
+        
+        # 按标点位置逐段切出句子，边切边处理，不生成中间列表
+        prev = 0
+        for m in self.SENTENCE_END_RE.finditer(text):
+            add(text[prev:m.end()])
+            prev = m.end()
+        add(text[prev:])
         
         return final_sentences
     
@@ -240,42 +362,42 @@ class SubtitleGenerator:
             return [sentence]
         
         parts = []
-        current = ""
-        
-        # 优先拆分点：逗号、顿号、冒号、分号
-        split_chars = ['，', '、', '：', '；', ',', ';']
+        start = 0  # 当前片段在 sentence 中的起点，片段为 sentence[start:i+1]，按下标切片不逐字拼接
+        min_length = max_length * 0.6
         
-        i = 0
-        while i < len(sentence):
-            current += sentence[i]
+        for i, char in enumerate(sentence):
+            length = i + 1 - start
             
             # 如果当前片段达到合理长度且遇到拆分点
-            if len(current) >= max_length * 0.6 and sentence[i] in split_chars:
-                parts.append(current.strip())
-                current = ""
+            if length >= min_length and char in self.SPLIT_CHARS:
+                parts.append(sentence[start:i + 1].strip())
+                start = i + 1
             # 如果当前片段超过最大长度，强制拆分
-            elif len(current) >= max_length:
-                # 尝试回退到最近的空格或标点
-                split_pos = max_length
-                for j in range(len(current) - 1, max(0, len(current) - 5), -1):
-                    if current[j] in split_chars + [' ', '　']:
+            elif length >= max_length:
+                # 尝试回退到最近的空格或标点（只看末尾4个字符）
+                end = i + 1
+                split_pos = start + max_length
+                for j in range(end - 1, max(start, end - 5), -1):
+                    if sentence[j] in self.FALLBACK_SPLIT_CHARS:
                         split_pos = j + 1
                         break
                 
-                parts.append(current[:split_pos].strip())
-                current = current[split_pos:].strip()
-            
-            i += 1
+                parts.append(sentence[start:split_pos].strip())
+                # 剩余部分去掉开头空白
+                start = split_pos
+                while start < end and sentence[start].isspace():
+                    start += 1
         
         # 添加剩余部分
-        if current.strip():
-            parts.append(current.strip())
+        rest = sentence[start:].strip()
+        if rest:
+            parts.append(rest)
         
         return parts
 
     def estimate_duration(self, text):
         # 计算有效字符数（去除标点和空格）
-        effective_chars = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', text)
+        effective_chars = self.NON_EFFECTIVE_CHAR_RE.sub('', text)
         char_count = len(effective_chars)
         # 根据语速计算时长，最少0.5秒
         duration = max(char_count / self.chars_per_second, 0.5)
@@ -288,18 +410,11 @@ class SubtitleGenerator:
             sentences: 句子列表
             start_offset: 起始时间偏移量(秒)
         """
-        timeline = []
-        current_time = start_offset
-
-        for sentence in sentences:
-            duration = self.estimate_duration(sentence)
-            start_time = current_time
-            end_time = current_time + duration
-            timeline.append({
-                'start': start_time,
-                'end': end_time,
-                'text': sentence
-            })
-            current_time = end_time
-
-        return timeline
+        # 先算出全部时长，再用前缀和一次得到各句的起止时间
+        durations = [self.estimate_duration(sentence) for sentence in sentences]
+        boundaries = list(accumulate(durations, initial=start_offset))
+
+        return [
+            {'start': start_time, 'end': end_time, 'text': sentence}
+            for sentence, start_time, end_time in zip(sentences, boundaries, boundaries[1:])
+        ]
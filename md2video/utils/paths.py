@@ -1,9 +1,12 @@
 """Path utilities for md2video package."""
 from pathlib import Path
 from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
 import os
 
 
+@lru_cache(maxsize=None)
 def get_project_root() -> Path:
     """获取 md2video 项目根目录（基于此文件位置）
     
@@ -13,15 +16,30 @@ def get_project_root() -> Path:
     return Path(__file__).parent.parent.resolve()
 
 
+@lru_cache(maxsize=32)
+def _ensure_dir(path_str: str) -> Path:
+    """创建目录（每个路径在进程内只 mkdir 一次）并返回 Path"""
+    path = Path(path_str)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def get_logs_dir() -> Path:
     """获取日志目录路径
     
     Returns:
         logs 目录的绝对路径
     """
-    logs_dir = get_project_root() / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    return logs_dir
+    return _ensure_dir(str(get_project_root() / "logs"))
+
+
+def get_cache_dir() -> Path:
+    """获取缓存目录路径（存放可复用的生成文件，如静音片段）
+    
+    Returns:
+        cache 目录的绝对路径
+    """
+    return _ensure_dir(str(get_project_root() / "cache"))
 
 
 def get_log_file_path(prefix: str = "main") -> str:
@@ -48,9 +66,7 @@ def get_output_dir(subdir: str = "") -> Path:
         Path object to output directory
     """
     today = date.today().strftime("%Y%m%d")
-    output_path = get_project_root() / "output" / today / subdir
-    output_path.mkdir(parents=True, exist_ok=True)
-    return output_path
+    return _ensure_dir(str(get_project_root() / "output" / today / subdir))
 
 
 def get_output_base_dir() -> Path:
@@ -59,9 +75,19 @@ def get_output_base_dir() -> Path:
     Returns:
         output 目录的绝对路径
     """
-    output_dir = get_project_root() / "output"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    return output_dir
+    return _ensure_dir(str(get_project_root() / "output"))
+
+
+def get_latest_output_dir() -> Optional[Path]:
+    """获取 output 下最新的日期目录（一次 scandir，按目录名取最大）
+    
+    Returns:
+        最新日期目录的路径，没有日期目录时返回 None
+    """
+    output_dir = get_output_base_dir()
+    with os.scandir(output_dir) as entries:
+        names = [entry.name for entry in entries if entry.is_dir() and entry.name.isdigit()]
+    return output_dir / max(names) if names else None
 
 
 def get_relative_path(file_path: str) -> Path:
@@ -0,0 +1,58 @@
+"""Retry utilities for md2video package."""
+import logging
+import random
+import time
+from typing import Optional
+
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 服务端明确拒绝、稍后可重试的状态码（限流、暂时不可用）
+TRANSIENT_STATUS_CODES = frozenset({429, 503})
+
+
+def response_status(exc: BaseException) -> Optional[int]:
+    """取出 HTTP 状态错误对应的状态码，其它异常返回 None"""
+    if isinstance(exc, (requests.HTTPError, httpx.HTTPStatusError)) and exc.response is not None:
+        return exc.response.status_code
+    return None
+
+
+def is_rejected_request(exc: BaseException) -> bool:
+    """请求被服务端以 429/503 拒绝：未被受理，重放非幂等的 POST 也安全"""
+    return response_status(exc) in TRANSIENT_STATUS_CODES
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """连接失败、超时或 429/503 等暂时性错误；缺少配置、输入文件等确定性错误不重试"""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                        httpx.NetworkError, httpx.TimeoutException)):
+        return True
+    return is_rejected_request(exc)
+
+
+def backoff_delay(attempt: int, base: float = 1.5) -> float:
+    """第 attempt 次失败后的等待秒数：指数退避加随机抖动，避免多个调用同时重试"""
+    return base ** attempt + random.random()
+
+
+def call_with_retry(fn, *, tries: int = 3, base: float = 1.5, is_transient=is_transient_error):
+    """同步调用 fn，遇到暂时性错误按退避重试，总次数不超过 tries
+
+    Args:
+        fn: 无参函数
+        tries: 最多调用次数（含第一次）
+        base: 退避底数
+        is_transient: 判断异常是否可重试
+    """
+    for attempt in range(tries):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == tries - 1 or not is_transient(e):
+                raise
+            delay = backoff_delay(attempt, base)
+            logger.warning(f"暂时性错误，{delay:.1f}秒后重试（第{attempt + 1}/{tries - 1}次）: {e}")
+            time.sleep(delay)
@@ -3,14 +3,30 @@
 """
 import os
 import json
+import hashlib
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import List, Dict
 from pathlib import Path
 import yaml
 from google import genai
 
 
+@lru_cache(maxsize=4096)
+def _format_post(idx: int, title: str, content: str, subreddit: str, url: str) -> str:
+    """格式化单条帖子（相同输入复用结果）"""
+    return f"""
+--- 帖子 {idx} ---
+标题: {title}
+内容: {content[:500]}
+来源: r/{subreddit}
+链接: {url}
+"""
+
+
 class NewsAnalyzer:
     """使用 Gemini 分析游戏新闻"""
     
@@ -18,6 +34,30 @@ class NewsAnalyzer:
 [{"title":"标题15字内","summary":"详细摘要100字以内，尽可能详细介绍，包含背景细节","audio_text":"播报3-5句话，简单介绍即可","original_url":"链接"}]
 要求：中文、直接陈述、只返回JSON"""
 
+    # 单次流式响应的最大字符数，防止异常响应无限增长
+    MAX_RESPONSE_CHARS = 200_000
+
+    # 结构化输出：要求模型直接返回符合该结构的 JSON 数组
+    RESPONSE_SCHEMA = {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "title": {"type": "STRING"},
+                "summary": {"type": "STRING"},
+                "audio_text": {"type": "STRING"},
+                "original_url": {"type": "STRING"},
+            },
+            "required": ["title", "summary", "audio_text", "original_url"],
+        },
+    }
+
+    # 去重时忽略标点和空白
+    NON_WORD_RE = re.compile(r'[\W_]+')
+
+    # 从带多余文字的响应中提取 JSON 数组
+    JSON_ARRAY_RE = re.compile(r'\[[\s\S]*\]')
+
     def __init__(self, config: dict = None):
         """初始化分析器"""
         self.config = config or self._load_default_config()
@@ -28,6 +68,19 @@ class NewsAnalyzer:
         
         self.model = self.config.get('model', 'gemini-2.5-flash')
         self.max_news = self.config.get('max_news', 5)
+        # 同时进行的批次数（受 Gemini 限流约束）
+        self.concurrency = max(1, self.config.get('concurrency', 4))
+        # 单批帖子文本的字符上限，未指定 batch_size 时按此打包
+        self.max_context_chars = self.config.get('max_context_chars', 400_000)
+        # SimHash 汉明距离不超过该值的帖子视为重复
+        self.dedup_distance = self.config.get('dedup_distance', 3)
+        # 并发批次共用控制台，避免输出交错
+        self._print_lock = threading.Lock()
+        
+        # 分析结果缓存（按模型+提示词+帖子内容寻址），相对路径基于本模块目录
+        self.cache_dir = Path(__file__).parent / self.config.get('cache_dir', '.cache/gemini')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_ttl = self.config.get('cache_ttl_hours', 24) * 3600
         
         # 初始化客户端（保持简单，和 gemini-api.py 一致）
         self.client = genai.Client(api_key=api_key)
@@ -39,26 +92,116 @@ class NewsAnalyzer:
             full_config = yaml.safe_load(f)
         return full_config.get('gemini', {})
     
+    def _log(self, message: str):
+        """线程安全的打印"""
+        with self._print_lock:
+            print(message, flush=True)
+    
+    def _cache_path(self, prompt: str) -> Path:
+        """根据模型和完整提示词计算缓存文件路径"""
+        key = hashlib.sha256(f"{self.model}|{prompt}".encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json"
+    
+    def _read_cache(self, path: Path, max_age: float = None):
+        """读取缓存，不存在、过期或损坏时返回 None"""
+        try:
+            if max_age is not None and time.time() - path.stat().st_mtime > max_age:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def _write_cache(self, path: Path, news: List[Dict]):
+        """原子写入缓存（先写临时文件再替换）"""
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(news, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self._log(f"   ⚠️ 写入缓存失败: {e}")
+            tmp_path.unlink(missing_ok=True)
+    
     def _format_posts(self, posts: List[Dict]) -> str:
         """格式化帖子数据用于分析"""
-        formatted = []
-        for i, post in enumerate(posts, 1):
-            formatted.append(f"""
---- 帖子 {i} ---
-标题: {post.get('title', '')}
-内容: {post.get('content', '')[:500]}
-来源: r/{post.get('subreddit', '')}
-链接: {post.get('url', '')}
-""")
-        return "\n".join(formatted)
+        return "\n".join(
+            _format_post(i, post.get('title', ''), post.get('content', ''),
+                         post.get('subreddit', ''), post.get('url', ''))
+            for i, post in enumerate(posts, 1)
+        )
     
-    def analyze(self, posts: List[Dict], batch_size: int = 10) -> List[Dict]:
+    def _simhash(self, text: str) -> int:
+        """计算文本字符 3-gram 的 64 位 SimHash（调用方保证 len(text) >= 3）"""
+        counts = [0] * 64
+        shingles = {text[i:i + 3] for i in range(len(text) - 2)}
+        # 按位移统计每一位上 1 的个数，多数为 1 的位置 1
+        for s in shingles:
+            h = int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+            for b in range(64):
+                counts[b] += (h >> b) & 1
+        half = len(shingles) / 2
+        return sum(1 << b for b in range(64) if counts[b] > half)
+    
+    def _dedupe_posts(self, posts: List[Dict]) -> List[Dict]:
+        """本地去除重复帖子（标题完全相同或标题+开头内容高度相似），减少 API 调用"""
+        seen_titles = set()
+        kept_hashes = []
+        kept = []
+        for post in posts:
+            title = self.NON_WORD_RE.sub('', post.get('title', '')).lower()
+            title_key = hashlib.blake2b(title.encode('utf-8'), digest_size=8).digest()
+            if title and title_key in seen_titles:
+                continue
+            
+            text = title + self.NON_WORD_RE.sub('', post.get('content', '')[:200]).lower()
+            # 文本太短凑不出 3-gram，只靠上面的标题精确去重
+            if len(text) >= 3:
+                fingerprint = self._simhash(text)
+                if any(bin(fingerprint ^ other).count('1') <= self.dedup_distance for other in kept_hashes):
+                    continue
+                kept_hashes.append(fingerprint)
+            
+            seen_titles.add(title_key)
+            kept.append(post)
+        return kept
+    
+    def _pack_batches(self, posts: List[Dict], batch_size: int = None) -> List[tuple]:
+        """
+        划分批次，返回 (起始下标, 结束下标) 列表
+        
+        指定 batch_size 时按固定条数切分；否则按格式化后的字符数贪心打包，
+        尽量用最少的请求装下所有帖子。
+        """
+        total_posts = len(posts)
+        if batch_size:
+            return [(start, min(start + batch_size, total_posts)) for start in range(0, total_posts, batch_size)]
+        
+        ranges = []
+        start = 0
+        batch_chars = 0
+        for i, post in enumerate(posts):
+            # 序号与 _format_posts 一致，格式化结果可直接复用缓存
+            post_chars = len(_format_post(i - start + 1, post.get('title', ''), post.get('content', ''),
+                                          post.get('subreddit', ''), post.get('url', '')))
+            if i > start and batch_chars + post_chars > self.max_context_chars:
+                ranges.append((start, i))
+                start = i
+                batch_chars = len(_format_post(1, post.get('title', ''), post.get('content', ''),
+                                               post.get('subreddit', ''), post.get('url', '')))
+            else:
+                batch_chars += post_chars
+        ranges.append((start, total_posts))
+        return ranges
+    
+    def analyze(self, posts: List[Dict], batch_size: int = None, force_refresh: bool = False) -> List[Dict]:
         """
         分批分析帖子并提取新闻
         
         Args:
             posts: 帖子列表 (dict 格式)
-            batch_size: 每批处理的帖子数量
+            batch_size: 每批处理的帖子数量（默认按 max_context_chars 打包）
+            force_refresh: 忽略缓存，强制重新调用 API
             
         Returns:
             提取的新闻列表（整合所有批次）
@@ -67,34 +210,37 @@ class NewsAnalyzer:
             print("⚠️ 没有帖子需要分析")
             return []
         
-        # 计算批次数量
+        # 调用 API 前先去重
+        unique_posts = self._dedupe_posts(posts)
+        if len(unique_posts) < len(posts):
+            print(f"🧹 去除 {len(posts) - len(unique_posts)} 条重复帖子")
+        posts = unique_posts
+        
+        # 划分批次
         total_posts = len(posts)
-        num_batches = (total_posts + batch_size - 1) // batch_size
+        batch_ranges = self._pack_batches(posts, batch_size)
+        num_batches = len(batch_ranges)
         
         print(f"\n🤖 使用 {self.model} 分批分析 {total_posts} 条帖子")
-        print(f"   📦 每批 {batch_size} 条，共 {num_batches} 批")
-        print(f"   💡 流式响应会实时显示进度\n")
+        print(f"   📦 共 {num_batches} 批，并发 {min(self.concurrency, num_batches)} 批\n")
         
-        all_news = []
+        # 按批次序号收集结果，完成顺序不影响最终顺序
+        results = [[] for _ in range(num_batches)]
         
-        for batch_idx in range(num_batches):
-            start_idx = batch_idx * batch_size
-            end_idx = min(start_idx + batch_size, total_posts)
-            batch_posts = posts[start_idx:end_idx]
-            
-            print(f"\n{'='*50}")
-            print(f"📦 批次 {batch_idx + 1}/{num_batches}：帖子 {start_idx + 1}-{end_idx}")
-            print(f"{'='*50}")
-            
-            batch_news = self._analyze_batch(batch_posts, batch_idx + 1, num_batches)
-            all_news.extend(batch_news)
-            
-            print(f"   ✅ 本批提取 {len(batch_news)} 条新闻")
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, num_batches)) as executor:
+            futures = {}
+            for batch_idx, (start_idx, end_idx) in enumerate(batch_ranges):
+                self._log(f"📦 批次 {batch_idx + 1}/{num_batches}：帖子 {start_idx + 1}-{end_idx}")
+                future = executor.submit(self._analyze_batch, posts[start_idx:end_idx], batch_idx + 1, num_batches,
+                                         force_refresh=force_refresh)
+                futures[future] = batch_idx
             
-            # 批次间休息，避免 API 限流
-            if batch_idx < num_batches - 1:
-                print(f"   ⏳ 等待 2 秒后处理下一批...")
-                time.sleep(2)
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                results[batch_idx] = future.result()
+                self._log(f"   ✅ 批次 {batch_idx + 1} 提取 {len(results[batch_idx])} 条新闻")
+        
+        all_news = [news for batch_news in results for news in batch_news]
         
         print(f"\n{'='*50}")
         print(f"🎉 全部完成！共提取 {len(all_news)} 条新闻")
@@ -102,15 +248,17 @@ class NewsAnalyzer:
         
         return all_news
     
-    def _analyze_batch(self, posts: List[Dict], batch_num: int, total_batches: int, max_retries: int = 3) -> List[Dict]:
+    def _analyze_batch(self, posts: List[Dict], batch_num: int, total_batches: int, max_retries: int = 3,
+                       force_refresh: bool = False) -> List[Dict]:
         """
-        分析单批帖子（带重试机制）
+        分析单批帖子（带重试机制和结果缓存）
         
         Args:
             posts: 帖子列表
             batch_num: 当前批次号
             total_batches: 总批次数
             max_retries: 最大重试次数
+            force_refresh: 忽略未过期的缓存
         """
         posts_text = self._format_posts(posts)
         
@@ -127,44 +275,65 @@ class NewsAnalyzer:
 
 请返回 JSON 格式的新闻列表。"""
 
+        cache_path = self._cache_path(full_prompt)
+        if not force_refresh:
+            cached = self._read_cache(cache_path, self.cache_ttl)
+            if cached is not None:
+                self._log(f"   💾 批次 {batch_num} 命中缓存")
+                return cached
+
         for attempt in range(max_retries):
             try:
                 start_time = time.time()
                 
                 if attempt > 0:
-                    print(f"   🔄 重试 {attempt}/{max_retries}...")
+                    self._log(f"   🔄 批次 {batch_num} 重试 {attempt}/{max_retries}...")
                     time.sleep(3)  # 重试前等待 3 秒
                 
                 # 使用流式响应
                 response_stream = self.client.models.generate_content_stream(
                     model=self.model,
-                    contents=full_prompt
+                    contents=full_prompt,
+                    config={
+                        "response_mime_type": "application/json",
+                        "response_schema": self.RESPONSE_SCHEMA,
+                    }
                 )
                 
-                full_response = ""
-                
-                print("   📥 接收响应: ", end="", flush=True)
+                parts = []
+                total_chars = 0
                 
                 for chunk in response_stream:
                     if hasattr(chunk, 'text') and chunk.text:
-                        full_response += chunk.text
-                        print(".", end="", flush=True)
+                        parts.append(chunk.text)
+                        total_chars += len(chunk.text)
+                        if total_chars > self.MAX_RESPONSE_CHARS:
+                            self._log(f"   ⚠️ 批次 {batch_num} 响应超过 {self.MAX_RESPONSE_CHARS} 字符，提前截断")
+                            break
                 
+                full_response = "".join(parts)
                 processing_time = time.time() - start_time
-                print(f" 完成 ({processing_time:.1f}秒)")
+                self._log(f"   📥 批次 {batch_num} 接收响应完成 ({processing_time:.1f}秒)")
                 
-                # 解析 JSON
-                return self._parse_json(full_response)
+                # 解析 JSON，只缓存非空结果
+                news = self._parse_json(full_response)
+                if news:
+                    self._write_cache(cache_path, news)
+                return news
                 
             except Exception as e:
-                print(f" ❌ 失败")
-                print(f"   错误: {type(e).__name__}: {str(e)[:100]}")
+                self._log(f"   ❌ 批次 {batch_num} 失败: {type(e).__name__}: {str(e)[:100]}")
                 
                 if attempt < max_retries - 1:
-                    print(f"   ⏳ 等待 5 秒后重试批次 {batch_num}...")
+                    self._log(f"   ⏳ 等待 5 秒后重试批次 {batch_num}...")
                     time.sleep(5)
                 else:
-                    print(f"   ⚠️ 批次 {batch_num} 已达最大重试次数，跳过")
+                    # API 不可用时退回到过期缓存
+                    stale = self._read_cache(cache_path)
+                    if stale is not None:
+                        self._log(f"   💾 批次 {batch_num} 已达最大重试次数，使用过期缓存")
+                        return stale
+                    self._log(f"   ⚠️ 批次 {batch_num} 已达最大重试次数，跳过")
                     return []  # 返回空列表，不影响其他批次
         
         return []
@@ -175,12 +344,12 @@ class NewsAnalyzer:
             return json.loads(response)
         except json.JSONDecodeError:
             # 尝试提取 JSON 部分
-            json_match = re.search(r'\[[\s\S]*\]', response)
+            json_match = self.JSON_ARRAY_RE.search(response)
             if json_match:
                 try:
                     return json.loads(json_match.group())
                 except json.JSONDecodeError:
                     pass
-            print(f"⚠️ 无法解析 JSON 响应")
+            self._log(f"⚠️ 无法解析 JSON 响应")
             return []
 
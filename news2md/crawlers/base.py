@@ -9,7 +9,7 @@ import json
 from pathlib import Path
 
 
-@dataclass
+@dataclass(slots=True)
 class NewsPost:
     """统一的帖子数据格式（精简版）"""
     title: str                      # 标题
@@ -2,13 +2,24 @@
 3DM新闻爬虫 - 使用 requests + BeautifulSoup 爬取3DM单机游戏新闻
 """
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import List
+import json
+import os
 import re
+import time
 
 from .base import BaseCrawler, NewsPost
 
+# 优先使用 C 实现的 lxml 解析器，未安装时回退到内置解析器
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 
 class DM3Crawler(BaseCrawler):
     """3DM单机游戏新闻爬虫"""
@@ -19,6 +30,18 @@ class DM3Crawler(BaseCrawler):
     # 最多收集多少条新闻
     MAX_POSTS = 30
     
+    # 只构建新闻条目节点，跳过页面其余部分
+    NEWS_ITEM_STRAINER = SoupStrainer('li', class_='selectpost')
+    
+    # 连续空白和 &nbsp; 残留，一次替换为单个空格
+    WHITESPACE_RE = re.compile(r'(?:\s|&nbsp;)+')
+    
+    # 条件请求缓存：保存上次的 ETag/Last-Modified 和解析结果
+    CACHE_PATH = Path(__file__).parent.parent / ".cache" / "3dm_etag.json"
+    
+    # Cache-Control 中的 max-age
+    MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+    
     USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     
     def __init__(self, config: dict = None):
@@ -34,6 +57,47 @@ class DM3Crawler(BaseCrawler):
             'Pragma': 'no-cache',
             'Referer': 'https://www.3dmgame.com/',
         })
+        self._cache_meta = self._load_cache_meta()
+    
+    def _load_cache_meta(self) -> dict:
+        """读取上次抓取的缓存信息，不存在或损坏时返回空字典"""
+        try:
+            with open(self.CACHE_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+    
+    def _save_cache_meta(self, response, posts: List[NewsPost]) -> None:
+        """保存响应头中的校验信息和解析结果（原子写入）"""
+        cache_control = response.headers.get('Cache-Control', '')
+        max_age_match = self.MAX_AGE_RE.search(cache_control)
+        self._cache_meta = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'max_age': int(max_age_match.group(1)) if max_age_match and 'no-cache' not in cache_control else 0,
+            'posts': [post.to_dict() for post in posts],
+        }
+        try:
+            self.CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.CACHE_PATH.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._cache_meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self.CACHE_PATH)
+        except OSError as e:
+            print(f"   ⚠️ 写入3DM缓存失败: {e}")
+    
+    def _cached_posts(self) -> List[NewsPost]:
+        """从缓存恢复帖子列表（剔除缓存期间已超出时间窗口的新闻）"""
+        posts = []
+        for data in self._cache_meta.get('posts', []):
+            try:
+                pub_time = datetime.fromisoformat(data.get('published_at', ''))
+            except (TypeError, ValueError):
+                pub_time = None
+            if self._is_recent(pub_time):
+                posts.append(NewsPost(**data))
+        return posts
     
     def test_connection(self) -> bool:
         """测试3DM网站连接"""
@@ -55,14 +119,33 @@ class DM3Crawler(BaseCrawler):
         posts = []
         
         try:
-            # 添加时间戳参数绕过 CDN 缓存
-            import time
-            cache_bust = f"?_t={int(time.time())}"
-            response = self.session.get(self.NEWS_URL + cache_bust, timeout=30)
+            meta = self._cache_meta
+            
+            # 仍在服务器给出的 max-age 有效期内，直接使用缓存
+            if meta.get('posts') and time.time() - meta.get('fetched_at', 0) < meta.get('max_age', 0):
+                posts = self._cached_posts()
+                print(f"   ✅ 缓存未过期，复用 {len(posts)} 条新闻")
+                return posts
+            
+            # 条件请求：页面未变化时服务器返回 304，省去下载和解析
+            # （会话已带 Cache-Control: no-cache，CDN 仍会向源站校验，无需时间戳参数）
+            headers = {}
+            if meta.get('posts'):
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+            
+            response = self.session.get(self.NEWS_URL, headers=headers, timeout=30)
+            if response.status_code == 304:
+                posts = self._cached_posts()
+                print(f"   ✅ 页面未变化 (304)，复用 {len(posts)} 条新闻")
+                return posts
             response.raise_for_status()
-            response.encoding = 'utf-8'
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # 传入原始字节，页面指定 utf-8
+            soup = BeautifulSoup(response.content, HTML_PARSER,
+                                 parse_only=self.NEWS_ITEM_STRAINER, from_encoding='utf-8')
             
             # 查找所有新闻条目（HTML中已按时间倒序，最新在前）
             news_items = soup.find_all('li', class_='selectpost')
@@ -76,12 +159,14 @@ class DM3Crawler(BaseCrawler):
                         posts.append(post)
                         # 打印第一条新闻的时间，验证是否从最新开始
                         if len(posts) == 1:
-                            print(f"   最新新闻: {post.title[30]}... ({post.published_at})")
+                            print(f"   最新新闻: {post.title[:30]}... ({post.published_at})")
                 except Exception as e:
                     print(f"   ⚠️ 解析新闻条目失败: {e}")
                     continue
             
             print(f"   ✅ 3DM爬取完成，获取 {len(posts)} 条新闻")
+            if posts:
+                self._save_cache_meta(response, posts)
             
         except requests.RequestException as e:
             print(f"   ❌ 请求3DM失败: {e}")
@@ -106,8 +191,8 @@ class DM3Crawler(BaseCrawler):
         if time_tag:
             time_str = time_tag.get_text(strip=True)
             try:
-                # 格式: 2025-12-04 09:34:07
-                published_at = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
+                # 格式: 2025-12-04 09:34:07（fromisoformat 为 C 实现，比 strptime 快得多）
+                published_at = datetime.fromisoformat(time_str)
             except ValueError:
                 pass
         
@@ -137,10 +222,8 @@ class DM3Crawler(BaseCrawler):
     
     def _clean_content(self, content: str) -> str:
         """清理内容"""
-        # 移除多余空白
-        content = re.sub(r'\s+', ' ', content).strip()
-        # 移除HTML实体残留
-        content = content.replace('&nbsp;', ' ')
+        # 移除多余空白和HTML实体残留（一次扫描）
+        content = self.WHITESPACE_RE.sub(' ', content).strip()
         # 限制长度
         return content[:1000] if len(content) > 1000 else content
     
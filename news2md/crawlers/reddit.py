@@ -3,16 +3,50 @@ Reddit 爬虫 - 使用 RSS Feed 获取游戏新闻（无需 API Key）
 """
 import re
 import html
-from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
 from typing import List
 from pathlib import Path
 import yaml
 import feedparser
 import requests
+from requests.adapters import HTTPAdapter
+
+# 优先使用基于 lxml 的 fastfeedparser，未安装时回退到纯 Python 的 feedparser
+try:
+    import fastfeedparser
+    parse_feed = fastfeedparser.parse
+except ImportError:
+    parse_feed = feedparser.parse
+
+# lxml 一次完成去标签和实体解码，未安装时回退到 html.unescape + 正则
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# 优先使用 libyaml 的 C 加载器
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 from .base import BaseCrawler, NewsPost
 
 
+@lru_cache(maxsize=4)
+def _load_config_file(path_str: str, mtime_ns: int) -> dict:
+    """按 (路径, 修改时间) 缓存 config.yaml 解析结果"""
+    with open(path_str, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YamlLoader) or {}
+
+
 class RedditCrawler(BaseCrawler):
     """Reddit RSS 爬虫"""
     
@@ -20,16 +54,33 @@ class RedditCrawler(BaseCrawler):
     # 使用真实浏览器 UA 避免被 Reddit 限制
     USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     
+    # RSS 条件请求缓存目录（每个 feed 保存 ETag/Last-Modified 和上次的响应内容）
+    FEED_CACHE_DIR = Path(__file__).parent.parent / ".cache" / "reddit"
+    
+    # 内容清理用的正则（预编译）
+    HTML_TAG_RE = re.compile(r'<[^>]+>')
+    SUBMITTED_BY_RE = re.compile(r'submitted by\s+/u/\S+\s*\[link\]\s*\[comments\]')
+    SUBREDDIT_RE = re.compile(r'/r/([^/]+)/')
+    
     def __init__(self, config: dict = None):
         super().__init__("reddit")
         self.config = config or self._load_default_config()
+        
+        # 所有 subreddit 共用一个会话，复用到 reddit.com 的 keep-alive 连接
+        self.session = requests.Session()
+        self.session.headers.update(self._get_headers())
+        pool_size = self.config.get('max_concurrency', 10)
+        self.session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    
+    def close(self):
+        """关闭 HTTP 会话"""
+        self.session.close()
     
     def _load_default_config(self) -> dict:
         """加载默认配置"""
         config_path = Path(__file__).parent.parent / "config.yaml"
-        with open(config_path, 'r', encoding='utf-8') as f:
-            full_config = yaml.safe_load(f)
-        return full_config.get('reddit', {})
+        full_config = _load_config_file(str(config_path), config_path.stat().st_mtime_ns)
+        return dict(full_config.get('reddit', {}))
     
     def _get_headers(self) -> dict:
         """获取请求头"""
@@ -40,18 +91,53 @@ class RedditCrawler(BaseCrawler):
             'Cache-Control': 'no-cache',
         }
     
-    def _fetch_rss(self, url: str, max_retries: int = 3) -> feedparser.FeedParserDict:
-        """使用 requests 获取 RSS 内容，然后用 feedparser 解析（带重试机制）"""
-        import time
-        
+    def _feed_cache_paths(self, url: str) -> tuple:
+        """返回 feed 的缓存元数据和响应内容文件路径"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        return self.FEED_CACHE_DIR / f"{key}.json", self.FEED_CACHE_DIR / f"{key}.xml"
+    
+    def _conditional_headers(self, url: str) -> dict:
+        """根据上次的响应生成 If-None-Match / If-Modified-Since 请求头"""
+        meta_path, body_path = self._feed_cache_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not body_path.exists():
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+    
+    def _save_feed_cache(self, url: str, response) -> None:
+        """保存响应内容和校验头（各 feed 独立文件，并发写入互不影响）"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        meta_path, body_path = self._feed_cache_paths(url)
+        try:
+            self.FEED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = body_path.with_suffix('.tmp')
+            tmp_path.write_bytes(response.content)
+            os.replace(tmp_path, body_path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'etag': etag, 'last_modified': last_modified}, f)
+        except OSError as e:
+            print(f"  ⚠️ 写入 RSS 缓存失败: {e}")
+    
+    def _request_with_retry(self, method: str, url: str, max_retries: int = 3, base_timeout: int = 30, **kwargs):
+        """发送请求，连接失败或超时时重试（HTTP 错误状态由调用方处理）"""
         last_exception = None
         for attempt in range(max_retries):
             try:
                 # 每次重试增加超时时间
-                timeout = 30 + (attempt * 10)
-                response = requests.get(url, headers=self._get_headers(), timeout=timeout)
-                response.raise_for_status()
-                return feedparser.parse(response.content)
+                timeout = base_timeout + (attempt * 10)
+                return self.session.request(method, url, timeout=timeout, **kwargs)
             except (requests.exceptions.ConnectionError, 
                     requests.exceptions.Timeout,
                     ConnectionResetError) as e:
@@ -63,25 +149,29 @@ class RedditCrawler(BaseCrawler):
                 else:
                     print(f"  ❌ 已重试 {max_retries} 次仍失败")
                     raise last_exception
-            except requests.exceptions.HTTPError as e:
-                # HTTP 错误不重试（如 403、404）
-                raise e
         
         raise last_exception
     
+    def _fetch_rss(self, url: str, max_retries: int = 3):
+        """使用 requests 获取 RSS 内容，然后用 fastfeedparser/feedparser 解析（带重试机制）"""
+        response = self._request_with_retry('GET', url, max_retries, headers=self._conditional_headers(url))
+        if response.status_code == 304:
+            # 内容未变化，解析上次保存的响应
+            return parse_feed(self._feed_cache_paths(url)[1].read_bytes())
+        # HTTP 错误不重试（如 403、404）
+        response.raise_for_status()
+        self._save_feed_cache(url, response)
+        return parse_feed(response.content)
+    
     def test_connection(self) -> bool:
-        """测试 RSS 连接（带重试）"""
+        """测试 RSS 连接（HEAD 请求，不下载和解析内容，带重试）"""
         try:
             test_url = self.RSS_BASE_URL.format(subreddit="Games")
             print("  🔄 正在连接 Reddit RSS...")
-            feed = self._fetch_rss(test_url)  # 已内置重试机制
-            
-            if len(feed.entries) > 0:
-                print("  ✅ Reddit RSS 连接成功！")
-                return True
-            else:
-                print("  ❌ Reddit RSS 返回空数据")
-                return False
+            response = self._request_with_retry('HEAD', test_url, base_timeout=10, allow_redirects=True)
+            response.raise_for_status()
+            print("  ✅ Reddit RSS 连接成功！")
+            return True
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 403:
                 print("  ❌ Reddit 返回 403，IP 被限制，跳过 Reddit")
@@ -95,72 +185,88 @@ class RedditCrawler(BaseCrawler):
     def _parse_published_time(self, entry) -> datetime:
         """解析发布时间"""
         # feedparser 会把时间解析到 published_parsed (time.struct_time)
-        if hasattr(entry, 'published_parsed') and entry.published_parsed:
+        if entry.get('published_parsed'):
             from time import mktime
-            return datetime.fromtimestamp(mktime(entry.published_parsed), tz=timezone.utc)
+            return datetime.fromtimestamp(mktime(entry['published_parsed']), tz=timezone.utc)
         
-        # 备用：直接解析字符串
-        if hasattr(entry, 'published'):
+        # fastfeedparser 直接给出 ISO 8601 字符串
+        if entry.get('published'):
             try:
                 # Reddit RSS 时间格式示例: "2024-12-03T10:30:00+00:00"
-                return datetime.fromisoformat(entry.published.replace('Z', '+00:00'))
+                return datetime.fromisoformat(entry['published'].replace('Z', '+00:00'))
             except:
                 pass
         
         # 默认返回当前时间
         return datetime.now(timezone.utc)
     
-    def _is_recent(self, pub_time: datetime, hours: int = 48) -> bool:
-        """检查是否是近期的帖子（默认48小时内）"""
-        from datetime import timedelta
-        now = datetime.now(timezone.utc)
-        cutoff = now - timedelta(hours=hours)
+    def _recent_cutoff(self, hours: int = 48) -> datetime:
+        """计算近期帖子的时间下限（每次爬取只算一次）"""
+        return datetime.now(timezone.utc) - timedelta(hours=hours)
+    
+    def _is_recent(self, pub_time: datetime, cutoff: datetime) -> bool:
+        """检查是否是近期的帖子（发布时间不早于 cutoff）"""
         return pub_time >= cutoff
     
+    def _html_to_text(self, content: str) -> str:
+        """HTML 片段转纯文本"""
+        if not content:
+            return ""
+        if lxml_html is not None:
+            try:
+                return lxml_html.fragment_fromstring(content, create_parent='div').text_content()
+            except (etree.ParserError, ValueError):
+                pass
+        # 没有 & 时不可能含实体，跳过 unescape
+        if '&' in content:
+            content = html.unescape(content)
+        return self.HTML_TAG_RE.sub('', content)
+    
     def _extract_content(self, entry) -> str:
         """从 RSS entry 提取内容"""
         content = ""
         
-        # 尝试获取内容
-        if hasattr(entry, 'content') and entry.content:
-            content = entry.content[0].get('value', '')
-        elif hasattr(entry, 'summary'):
-            content = entry.summary or ''
+        # 尝试获取内容（feedparser 为 content/summary，fastfeedparser 为 content/description）
+        entry_content = entry.get('content')
+        if entry_content:
+            content = entry_content if isinstance(entry_content, str) else entry_content[0].get('value', '')
+        else:
+            content = entry.get('summary') or entry.get('description') or ''
         
-        # 解码 HTML 实体 (&#32; -> 空格, &quot; -> 引号 等)
-        content = html.unescape(content)
-        
-        # 清理 HTML 标签
-        content = re.sub(r'<[^>]+>', '', content)
+        # 去除 HTML 标签并解码实体 (&#32; -> 空格, &quot; -> 引号 等)
+        content = self._html_to_text(content)
         
         # 清理 "submitted by /u/xxx [link] [comments]" 这类固定文本
-        content = re.sub(r'submitted by\s+/u/\S+\s*\[link\]\s*\[comments\]', '', content)
+        content = self.SUBMITTED_BY_RE.sub('', content)
         
         # 清理多余空白
-        content = re.sub(r'\s+', ' ', content).strip()
+        content = ' '.join(content.split())
         
         return content[:1000] if content else ""  # 限制长度
     
     def _extract_subreddit(self, entry) -> str:
         """从 entry 提取 subreddit 名称"""
         # 从 link 中提取: https://www.reddit.com/r/Games/comments/...
-        if hasattr(entry, 'link'):
-            match = re.search(r'/r/([^/]+)/', entry.link)
+        if entry.get('link'):
+            match = self.SUBREDDIT_RE.search(entry['link'])
             if match:
                 return match.group(1)
         return "unknown"
     
-    def _to_news_post(self, entry, subreddit: str) -> NewsPost:
-        """将 RSS entry 转换为 NewsPost"""
-        pub_time = self._parse_published_time(entry)
+    def _to_news_post(self, entry, subreddit: str, pub_time: datetime = None) -> NewsPost:
+        """将 RSS entry 转换为 NewsPost（pub_time 已解析时直接传入）"""
+        if pub_time is None:
+            pub_time = self._parse_published_time(entry)
         
         # 解码标题中的 HTML 实体
-        title = html.unescape(entry.title) if hasattr(entry, 'title') else "无标题"
+        title = entry.get('title') or "无标题"
+        if '&' in title:
+            title = html.unescape(title)
         
         return NewsPost(
             title=title,
             content=self._extract_content(entry),
-            url=entry.link if hasattr(entry, 'link') else "",
+            url=entry.get('link', ""),
             published_at=pub_time.isoformat(),
             subreddit=subreddit
         )
@@ -172,15 +278,16 @@ class RedditCrawler(BaseCrawler):
         
         try:
             feed = self._fetch_rss(url)
+            cutoff = self._recent_cutoff(hours=48)
             
             for entry in feed.entries:
                 pub_time = self._parse_published_time(entry)
                 
                 # 只保留48小时内的帖子
-                if not self._is_recent(pub_time, hours=48):
+                if not self._is_recent(pub_time, cutoff):
                     continue
                 
-                posts.append(self._to_news_post(entry, subreddit_name))
+                posts.append(self._to_news_post(entry, subreddit_name, pub_time))
             
             print(f"  📰 r/{subreddit_name}: 获取 {len(posts)} 条帖子")
             
@@ -193,23 +300,23 @@ class RedditCrawler(BaseCrawler):
     
     def crawl(self) -> List[NewsPost]:
         """爬取所有配置的 subreddit"""
-        all_posts = []
         subreddits = self.config.get('subreddits', ['Games'])
         
         print(f"\n🚀 开始爬取 Reddit RSS，共 {len(subreddits)} 个 subreddit...")
         print(f"   筛选条件: /top?t=day (48小时内发布)")
         
-        for subreddit_name in subreddits:
-            posts = self.crawl_subreddit(subreddit_name)
-            all_posts.extend(posts)
-        
-        # 去重（同一帖子可能出现在多个 subreddit）
+        # 收集时直接去重（同一帖子可能出现在多个 subreddit）
         seen_urls = set()
         unique_posts = []
-        for post in all_posts:
-            if post.url not in seen_urls:
-                seen_urls.add(post.url)
-                unique_posts.append(post)
+        
+        # 各 subreddit 互不依赖，并发请求；map 保持配置顺序，去重结果稳定
+        max_workers = max(1, min(len(subreddits), self.config.get('max_concurrency', 10)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for posts in executor.map(self.crawl_subreddit, subreddits):
+                for post in posts:
+                    if post.url not in seen_urls:
+                        seen_urls.add(post.url)
+                        unique_posts.append(post)
         
         print(f"\n✅ 爬取完成！共获取 {len(unique_posts)} 条帖子")
         return unique_posts
@@ -3,7 +3,7 @@ Markdown 生成器 - 生成 newsText.md 和 audioText.md
 输出到 news2md/output/日期/ 目录，不影响 md2video
 """
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
 from pathlib import Path
 
 
@@ -24,7 +24,36 @@ class MarkdownGenerator:
             today = datetime.now().strftime("%Y%m%d")
             self.output_dir = Path(__file__).parent / "output" / today
         
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 输出目录在第一次保存时才创建
+        self._dir_ready = False
+    
+    def _iter_news_lines(self, news_list: List[Dict]) -> Iterator[str]:
+        """逐条生成 newsText.md 内容块（用换行连接后与原格式一致）"""
+        for news in news_list:
+            yield f"## {news.get('title', '无标题')}\n{news.get('summary', '')}\n"
+    
+    def _iter_audio_lines(self, news_list: List[Dict]) -> Iterator[str]:
+        """逐条生成 audioText.md 内容块（用换行连接后与原格式一致）"""
+        # 每条新闻单独一个章节
+        for i, news in enumerate(news_list):
+            title = news.get('title', '游戏资讯')
+            audio_text = news.get('audio_text') or news.get('summary', '')
+            if audio_text:
+                # 第一条新闻前加开场白
+                if i == 0:
+                    audio_text = f"欢迎收看今天的单机游戏日报。{audio_text}"
+                yield f"## {title}\n{audio_text}\n"
+        
+        # 结束语（单独章节）
+        yield "## 结束\n今天的单机游戏资讯就到这里，感谢收看。\n"
+    
+    def _write_lines(self, path: Path, lines: Iterable[str]) -> None:
+        """按换行连接的格式逐块写入文件，不拼接完整字符串"""
+        with open(path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+            for i, line in enumerate(lines):
+                if i:
+                    f.write("\n")
+                f.write(line)
     
     def generate_news_text(self, news_list: List[Dict]) -> str:
         """
@@ -34,14 +63,7 @@ class MarkdownGenerator:
         ## 新闻标题
         新闻摘要
         """
-        lines = []
-        for news in news_list:
-            title = news.get('title', '无标题')
-            summary = news.get('summary', '')
-            lines.append(f"## {title}")
-            lines.append(summary)
-            lines.append("")
-        return "\n".join(lines)
+        return "\n".join(self._iter_news_lines(news_list))
     
     def generate_audio_text(self, news_list: List[Dict]) -> str:
         """
@@ -57,27 +79,7 @@ class MarkdownGenerator:
         ## 结束
         结束语
         """
-        lines = []
-        
-        # 每条新闻单独一个章节
-        for i, news in enumerate(news_list):
-            title = news.get('title', '游戏资讯')
-            audio_text = news.get('audio_text') or news.get('summary', '')
-            if audio_text:
-                lines.append(f"## {title}")
-                # 第一条新闻前加开场白
-                if i == 0:
-                    lines.append(f"欢迎收看今天的单机游戏日报。{audio_text}")
-                else:
-                    lines.append(audio_text)
-                lines.append("")
-        
-        # 结束语（单独章节）
-        lines.append("## 结束")
-        lines.append("今天的单机游戏资讯就到这里，感谢收看。")
-        lines.append("")
-        
-        return "\n".join(lines)
+        return "\n".join(self._iter_audio_lines(news_list))
     
     def save(self, news_list: List[Dict]) -> Dict[str, Path]:
         """
@@ -89,17 +91,18 @@ class MarkdownGenerator:
         Returns:
             生成的文件路径
         """
+        if not self._dir_ready:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self._dir_ready = True
+        
         news_text_path = self.output_dir / "newsText.md"
         audio_text_path = self.output_dir / "audioText.md"
         
-        # 生成并保存
-        news_content = self.generate_news_text(news_list)
-        audio_content = self.generate_audio_text(news_list)
-        
-        news_text_path.write_text(news_content, encoding='utf-8')
+        # 边生成边写入
+        self._write_lines(news_text_path, self._iter_news_lines(news_list))
         print(f"✅ 已生成 {news_text_path}")
         
-        audio_text_path.write_text(audio_content, encoding='utf-8')
+        self._write_lines(audio_text_path, self._iter_audio_lines(news_list))
         print(f"✅ 已生成 {audio_text_path}")
         
         return {
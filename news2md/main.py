@@ -7,12 +7,15 @@ news2md - 新闻采集与MD生成
     python main.py --crawl      # 仅爬取数据
     python main.py --analyze    # 仅分析已有数据并生成MD
     python main.py --test       # 测试API连接
+    python main.py --refresh    # 忽略 Gemini 分析缓存
 """
 import os
 import sys
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
 # 添加项目路径
@@ -29,49 +32,71 @@ else:
     print(f"⚠️ 未找到 .env 文件: {env_path}")
     print("   请创建 news2md/.env 文件并设置 GEMINI_API_KEY")
 
+# orjson 读写 JSON 更快，未安装时回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from crawlers import RedditCrawler, DM3Crawler
 from analyzer import NewsAnalyzer
 from generator import MarkdownGenerator
 
 
-def get_output_dir() -> Path:
-    """获取今日输出目录"""
-    today = datetime.now().strftime("%Y%m%d")
+@lru_cache(maxsize=None)
+def _ensure_output_dir(today: str) -> Path:
+    """创建指定日期的输出目录（每个日期只创建一次）"""
     output_dir = Path(__file__).parent / "output" / today
     output_dir.mkdir(parents=True, exist_ok=True)
     return output_dir
 
 
-def crawl() -> Path:
-    """爬取 Reddit + 3DM 数据"""
-    print("\n" + "=" * 50)
-    print("📡 步骤 1: 爬取新闻数据")
-    print("=" * 50)
-    
-    all_posts = []
-    
-    # 1. 爬取 Reddit
-    print("\n🔹 Reddit:")
+def get_output_dir() -> Path:
+    """获取今日输出目录"""
+    return _ensure_output_dir(datetime.now().strftime("%Y%m%d"))
+
+
+def crawl_reddit(reddit_crawler: RedditCrawler) -> list:
+    """爬取 Reddit，失败时返回空列表"""
     try:
-        reddit_crawler = RedditCrawler()
         if reddit_crawler.test_connection():
             reddit_posts = reddit_crawler.crawl()
-            all_posts.extend(reddit_posts)
-            print(f"   ✅ 获取 {len(reddit_posts)} 条")
-        else:
-            print("   ⚠️ Reddit 连接失败，跳过")
+            print(f"   ✅ Reddit 获取 {len(reddit_posts)} 条")
+            return reddit_posts
+        print("   ⚠️ Reddit 连接失败，跳过")
     except Exception as e:
         print(f"   ⚠️ Reddit 爬取失败: {e}")
-    
-    # 2. 爬取 3DM
-    print("\n🔹 3DM:")
+    return []
+
+
+def crawl_dm3() -> list:
+    """爬取 3DM，失败时返回空列表"""
     try:
-        dm3_crawler = DM3Crawler()
-        dm3_posts = dm3_crawler.crawl()
-        all_posts.extend(dm3_posts)
-        print(f"   ✅ 获取 {len(dm3_posts)} 条")
+        dm3_posts = DM3Crawler().crawl()
+        print(f"   ✅ 3DM 获取 {len(dm3_posts)} 条")
+        return dm3_posts
     except Exception as e:
         print(f"   ⚠️ 3DM 爬取失败: {e}")
+    return []
+
+
+def crawl() -> Path:
+    """爬取 Reddit + 3DM 数据"""
+    print("\n" + "=" * 50)
+    print("📡 步骤 1: 爬取新闻数据")
+    print("=" * 50)
+    
+    # Reddit 爬虫实例在爬取和保存时复用
+    reddit_crawler = RedditCrawler()
+    
+    # 各来源互不依赖，并发爬取；结果仍按 Reddit、3DM 的顺序合并
+    print("\n🔹 并发爬取 Reddit + 3DM:")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        reddit_future = executor.submit(crawl_reddit, reddit_crawler)
+        dm3_future = executor.submit(crawl_dm3)
+        results = [reddit_future.result(), dm3_future.result()]
+    reddit_crawler.close()
+    all_posts = [post for posts in results for post in posts]
     
     if not all_posts:
         raise RuntimeError("未获取到任何数据")
@@ -83,28 +108,30 @@ def crawl() -> Path:
     output_path = output_dir / "raw_posts.json"
     
     # 使用 Reddit 爬虫的 save_to_json 方法保存
-    reddit_crawler = RedditCrawler()
     reddit_crawler.save_to_json(all_posts, output_path)
     
     return output_path
 
 
-def analyze(json_path: Path) -> list:
+def analyze(json_path: Path, force_refresh: bool = False) -> list:
     """分析新闻"""
     print("\n" + "=" * 50)
     print("🤖 步骤 2: Gemini 分析")
     print("=" * 50)
     
     # 读取数据
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if orjson is not None:
+        data = orjson.loads(json_path.read_bytes())
+    else:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
     
     posts = data.get('posts', [])
     print(f"📖 读取 {len(posts)} 条帖子")
     
     # 分析
     analyzer = NewsAnalyzer()
-    news_list = analyzer.analyze(posts)
+    news_list = analyzer.analyze(posts, force_refresh=force_refresh)
     
     if not news_list:
         raise RuntimeError("分析未返回新闻")
@@ -112,8 +139,11 @@ def analyze(json_path: Path) -> list:
     # 保存分析结果
     output_dir = json_path.parent
     result_path = output_dir / "analyzed_news.json"
-    with open(result_path, 'w', encoding='utf-8') as f:
-        json.dump(news_list, ensure_ascii=False, indent=2, fp=f)
+    if orjson is not None:
+        result_path.write_bytes(orjson.dumps(news_list, option=orjson.OPT_INDENT_2))
+    else:
+        with open(result_path, 'w', encoding='utf-8') as f:
+            json.dump(news_list, ensure_ascii=False, indent=2, fp=f)
     print(f"✅ 分析结果已保存到 {result_path}")
     
     return news_list
@@ -162,6 +192,7 @@ def main():
     parser.add_argument('--analyze', action='store_true', help='仅分析已有数据')
     parser.add_argument('--test', action='store_true', help='测试API连接')
     parser.add_argument('--json', type=str, help='指定要分析的JSON文件')
+    parser.add_argument('--refresh', action='store_true', help='忽略分析缓存，重新调用 Gemini')
     
     args = parser.parse_args()
     
@@ -190,7 +221,7 @@ def main():
                 print("   请先运行爬取，或使用 --json 指定文件")
                 return
             
-            news_list = analyze(json_path)
+            news_list = analyze(json_path, force_refresh=args.refresh)
             generate(news_list)
             
         elif args.crawl:
@@ -200,7 +231,7 @@ def main():
         else:
             # 完整流程
             json_path = crawl()
-            news_list = analyze(json_path)
+            news_list = analyze(json_path, force_refresh=args.refresh)
             generate(news_list)
         
         print("\n" + "=" * 50)